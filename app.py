@@ -1,13 +1,23 @@
 """FastHTML application initialization."""
 from fasthtml.common import *
-from starlette.staticfiles import StaticFiles
+from starlette.middleware import Middleware
 from config import ADMIN_PASSWORD, ANALYTICS_DB
+from services.analytics import start_analytics, shutdown_analytics
+from services.assets import STATIC_DIR, PrecompressedStaticFiles, asset_url, manifest
+from services.compression import CompressionMiddleware
+from services.game_state import start_game_state, stop_game_state
+from services.timing import (
+    RequestTimingMiddleware,
+    SessionBoundaryMiddleware,
+    mark_handler_start,
+    mark_handler_end,
+)
 
 app, rt = fast_app(
     pico=False,
     hdrs=(
-        Link(rel="stylesheet", href="/static/bundle.css"),
-        Script(src="/static/bundle.js", defer=""),
+        Link(rel="stylesheet", href=asset_url("bundle.css")),
+        Script(src=asset_url("bundle.js"), defer=""),
         Meta(
             name="description",
             content="Kniffelblock online - kostenlos, ohne Registrierung",
@@ -23,14 +33,50 @@ app, rt = fast_app(
         ),
     ),
     bodykw={"class": "bg-gray-50 flex flex-col min-h-screen"},
+    # Timing is outermost so the total includes compression
+    middleware=[Middleware(RequestTimingMiddleware), Middleware(CompressionMiddleware)],
+    before=mark_handler_start,
 )
 
-# Explicitly mount static files for Railway compatibility
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Request phase timing: the boundary middleware goes just inside the session
+# middleware, and the handler-end hook runs before any other after-hook
+app.user_middleware.append(Middleware(SessionBoundaryMiddleware))
+app.after.append(mark_handler_end)
+
+# Explicitly mount static files for Railway compatibility. Fingerprinted
+# bundles are served precompressed and cached as immutable
+app.mount(
+    "/static",
+    PrecompressedStaticFiles(directory=STATIC_DIR, manifest=manifest),
+    name="static",
+)
 
 setup_toasts(app)
 
-# Import all route modules to register their handlers
+# With several worker processes only one runs the periodic jobs (see main.py)
+app.state.background_jobs = True
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    """Start jobs that run outside the request path."""
+    if app.state.background_jobs:
+        start_analytics()
+        start_game_state()
+
+
+@app.on_event("shutdown")
+def flush_analytics():
+    """Write queued analytics events before the process exits."""
+    stop_game_state()
+    shutdown_analytics()
+
+
+# Import the route modules to register their handlers. The admin pages are
+# rarely used, so their module is only imported by the first /admin request
 from routes import main as main_routes
 from routes import game as game_routes
-from routes import admin as admin_routes
+from routes import events as events_routes
+from routes.lazy import LazyRoutes
+
+app.router.routes.append(LazyRoutes(app.router, "/admin", "routes.admin"))
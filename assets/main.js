@@ -7,4 +7,85 @@ window.Alpine = Alpine;
 // Start Alpine
 Alpine.start();
 
+// Analytics events are buffered and sent to /events/batch in one beacon every
+// FLUSH_INTERVAL ms, when MAX_BATCH events are waiting, or when the page is
+// hidden. Each event is [type, age in ms] or [type, age in ms, category].
+const MAX_BATCH = 50;
+const FLUSH_INTERVAL = 10000;
+const pendingEvents = [];
+
+function flushEvents() {
+  while (pendingEvents.length) {
+    const now = Date.now();
+    const batch = pendingEvents
+      .splice(0, MAX_BATCH)
+      .map(([type, at, category]) => (category ? [type, now - at, category] : [type, now - at]));
+    const body = new Blob([JSON.stringify(batch)], { type: 'application/json' });
+    if (!navigator.sendBeacon?.('/events/batch', body)) {
+      fetch('/events/batch', { method: 'POST', body, keepalive: true }).catch(() => {});
+    }
+  }
+}
+
+window.trackEvent = (type, category) => {
+  pendingEvents.push([type, Date.now(), category]);
+  if (pendingEvents.length >= MAX_BATCH) flushEvents();
+};
+
+setInterval(flushEvents, FLUSH_INTERVAL);
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'hidden') flushEvents();
+});
+window.addEventListener('pagehide', flushEvents);
+
+// Score edits are coalesced: instead of one /update-score request per cell,
+// edits made within SCORE_DEBOUNCE ms of each other go to /update-scores in
+// one request, whose response only holds out-of-band swaps. A later edit of
+// the same cell replaces the pending one, and only one batch is in flight.
+const SCORE_DEBOUNCE = 300;
+const pendingScores = new Map();
+let scoreTimer = null;
+let scoreRequest = null;
+
+function takeScores() {
+  const values = { user: [], category: [], value: [] };
+  for (const [user, category, value] of pendingScores.values()) {
+    values.user.push(user);
+    values.category.push(category);
+    values.value.push(value);
+  }
+  pendingScores.clear();
+  return values;
+}
+
+function flushScores() {
+  clearTimeout(scoreTimer);
+  if (scoreRequest || !pendingScores.size) return;
+  scoreRequest = window.htmx
+    .ajax('POST', '/update-scores', { values: takeScores(), swap: 'none' })
+    .finally(() => {
+      scoreRequest = null;
+      flushScores();
+    });
+}
+
+document.addEventListener('htmx:confirm', (evt) => {
+  const match = evt.detail.path?.match(/^\/update-score\/([^/]+)\/([^/]+)$/);
+  if (!match || !window.htmx) return;
+  evt.preventDefault();
+  pendingScores.set(evt.detail.path, [match[1], match[2], evt.detail.elt.value]);
+  clearTimeout(scoreTimer);
+  scoreTimer = setTimeout(flushScores, SCORE_DEBOUNCE);
+});
+
+// A beacon still delivers edits that are pending when the page goes away
+window.addEventListener('pagehide', () => {
+  if (!pendingScores.size) return;
+  const form = new FormData();
+  for (const [name, list] of Object.entries(takeScores())) {
+    for (const item of list) form.append(name, item);
+  }
+  navigator.sendBeacon?.('/update-scores', form);
+});
+
 console.log('Kniffel app loaded - Alpine initialized (HTMX via FastHTML CDN)');
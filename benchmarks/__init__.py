@@ -0,0 +1 @@
+"""Micro-benchmarks and load tests; run each module with `python -m benchmarks.<name>`."""
@@ -0,0 +1,18 @@
+"""Random games shared by the benchmarks."""
+from models import categories
+from services.scoreboard import Scoreboard
+
+
+def make_game(players, rng):
+    """A game in the dict format: `players` players with about 60% of categories filled."""
+    users = [f"Spieler {i}" for i in range(players)]
+    scores = {
+        user: {cat: rng.randint(0, 30) for cat in categories if rng.random() < 0.6}
+        for user in users
+    }
+    return {"users": users, "scores": scores}
+
+
+def make_board(players, rng):
+    """The same random game as a `Scoreboard`."""
+    return Scoreboard.from_dict(make_game(players, rng))
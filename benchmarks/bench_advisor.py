@@ -0,0 +1,72 @@
+"""Best-move lookup latency and the memory the mapped strategy table uses.
+
+    python -m services.strategy_solver   # build strategy.bin first (needs NumPy)
+    python -m benchmarks.bench_advisor [strategy.bin]
+
+The table is file-backed: its pages show up as RssFile (shared with every
+other process that maps the file), not as private RssAnon memory.
+"""
+import random
+import sys
+import timeit
+from models import categories
+from services.strategy import get_table
+
+
+def memory():
+    """Resident memory counters of this process in KiB (Linux only)."""
+    fields = {}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "RssAnon", "RssFile"):
+                    fields[name] = int(value.split()[0])
+    except FileNotFoundError:
+        pass
+    return fields
+
+
+def random_card(rng):
+    """A card with a random number of filled categories and plausible scores."""
+    filled = rng.sample(list(categories), rng.randint(0, 12))
+    return {category: rng.randint(0, 30) for category in filled}
+
+
+def main():
+    before = memory()
+    table = get_table(sys.argv[1] if len(sys.argv) > 1 else None)
+    if table is None:
+        sys.exit("No strategy table; run `python -m services.strategy_solver` first")
+    mapped = memory()
+
+    rng = random.Random(42)
+    cases = [
+        (random_card(rng), tuple(rng.randint(1, 6) for _ in range(5)))
+        for _ in range(1000)
+    ]
+    # Touch every page once so the resident numbers show the whole table
+    for offset in range(0, len(table._mmap), 4096):
+        table._mmap[offset]
+    touched = memory()
+
+    number = 20
+    seconds = min(
+        timeit.repeat(
+            lambda: [table.best_category(card, dice) for card, dice in cases],
+            number=number,
+            repeat=5,
+        )
+    )
+    print(f"best_category: {seconds / number / len(cases) * 1e6:.1f} µs per lookup")
+    print(f"table file: {len(table._mmap) / 1024:.0f} KiB")
+    print(f"{'KiB':>14} {'VmRSS':>8} {'RssAnon':>8} {'RssFile':>8}")
+    for label, counters in (("before", before), ("mapped", mapped), ("all touched", touched)):
+        print(
+            f"{label:>14} "
+            + " ".join(f"{counters.get(name, 0):>8}" for name in ("VmRSS", "RssAnon", "RssFile"))
+        )
+
+
+if __name__ == "__main__":
+    main()
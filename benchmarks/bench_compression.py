@@ -0,0 +1,35 @@
+"""Bytes on the wire and CPU cost of compressing typical responses.
+
+    python -m benchmarks.bench_compression
+"""
+import random
+import timeit
+from fasthtml.common import to_xml
+from components.game import ScoreTableContainer, ScoreUpdate
+from benchmarks._fixtures import make_board
+from services.compression import CODECS
+
+
+def main():
+    rng = random.Random(42)
+    board = make_board(2, rng)
+    user = board.users[0]
+    responses = [("score update", to_xml(ScoreUpdate(board, user, "Einser")))] + [
+        (f"table, {players}p", to_xml(ScoreTableContainer(make_board(players, rng))))
+        for players in (2, 8)
+    ]
+    print(f"{'response':>14} {'codec':>6} {'bytes':>8} {'wire':>8} {'ratio':>6} {'µs':>8}")
+    for label, html in responses:
+        body = html.encode()
+        for name, codec in CODECS.items():
+            compressed = codec(body)
+            number = 200
+            seconds = min(timeit.repeat(lambda: codec(body), number=number, repeat=5))
+            print(
+                f"{label:>14} {name:>6} {len(body):>8} {len(compressed):>8} "
+                f"{len(body) / len(compressed):>5.1f}x {seconds / number * 1e6:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Compare score table rendering with and without the render cache.
+
+    python -m benchmarks.bench_render
+"""
+import random
+import re
+import timeit
+from fasthtml.common import to_xml
+from components import game as game_components
+from components import layout
+from components.prerender import disabled
+from benchmarks._fixtures import make_board
+
+
+def render_table(board):
+    return to_xml(game_components.ScoreTableContainer(board))
+
+
+def render_header():
+    return to_xml(layout.Header())
+
+
+def normalized(html):
+    return re.sub(r">\s+<", "><", html).strip()
+
+
+def timed(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'render':>12} {'uncached µs':>12} {'cached µs':>10} {'speedup':>8}")
+    cases = [("header", render_header, 1000)] + [
+        (f"{players} players", lambda b=make_board(players, rng): render_table(b), number)
+        for players, number in ((0, 1000), (2, 40), (8, 10))
+    ]
+    for label, render, number in cases:
+        with disabled():
+            expected = render()
+            before = timed(render, number)
+        assert normalized(render()) == normalized(expected)
+        after = timed(render, number)
+        print(f"{label:>12} {before:>12.1f} {after:>10.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
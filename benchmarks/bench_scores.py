@@ -0,0 +1,63 @@
+"""Compare per-render score computation: old per-row calls vs one score card per player.
+
+    python -m benchmarks.bench_scores
+"""
+import random
+import timeit
+from benchmarks._fixtures import make_game
+from models import categories, upper_section
+from services.scoreboard import Scoreboard
+
+
+def legacy_totals(scores, users):
+    """What ScoreTable did before: three calculate_scores calls and a missing scan per player."""
+
+    def calculate_scores(user_scores):
+        upper_total = sum(user_scores.get(cat, 0) or 0 for cat in upper_section)
+        bonus = 35 if upper_total >= 63 else 0
+        total = (
+            upper_total
+            + bonus
+            + sum(
+                user_scores.get(cat, 0) or 0
+                for cat in categories
+                if cat not in upper_section
+            )
+        )
+        return upper_total, bonus, total
+
+    missing = [
+        [cat for cat in categories if scores.get(user, {}).get(cat) is None]
+        for user in users
+    ]
+    totals = [
+        [calculate_scores(scores.get(user, {}))[i] for user in users] for i in range(3)
+    ]
+    return missing, totals
+
+
+def card_totals(board):
+    """What ScoreTable does now: one single-pass score card per player."""
+    cards = [board.score_card(user) for user in board.users]
+    missing = [card.missing for card in cards]
+    totals = [[card[i] for card in cards] for i in (0, 1, 3)]
+    return missing, totals
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'players':>8} {'legacy µs':>12} {'score card µs':>14} {'speedup':>8}")
+    for players in (2, 8, 50):
+        game = make_game(players, rng)
+        scores, users = game["scores"], game["users"]
+        board = Scoreboard.from_dict(game)
+        assert legacy_totals(scores, users) == card_totals(board)
+        number = 20000 // players
+        legacy = min(timeit.repeat(lambda: legacy_totals(scores, users), number=number, repeat=5))
+        card = min(timeit.repeat(lambda: card_totals(board), number=number, repeat=5))
+        legacy_us, card_us = legacy / number * 1e6, card / number * 1e6
+        print(f"{players:>8} {legacy_us:>12.1f} {card_us:>14.1f} {legacy_us / card_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
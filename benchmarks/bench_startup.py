@@ -0,0 +1,64 @@
+"""Cold-start import time of `app` and `main`, checked against a budget.
+
+    python -m benchmarks.bench_startup [--budget-ms 750] [--runs 5]
+
+Each run imports `main` in a fresh interpreter with `python -X importtime`.
+The median cumulative times are compared with the budget and the script
+exits with status 1 if either is over it, so it can gate a deploy.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from routes.lazy import LAZY_MODULES
+
+
+def import_times():
+    """{module: (self µs, cumulative µs)} for one cold `import main`."""
+    check = f"import sys, main; print([m for m in {LAZY_MODULES!r} if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times, result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=750)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    times = [t for t, _ in runs]
+    slowest = sorted(times[-1].items(), key=lambda item: item[1][0], reverse=True)[:10]
+    print(f"{'module':>40} {'self ms':>8} {'total ms':>9}")
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{name:>40} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+    print()
+
+    failed = False
+    for module in ("app", "main"):
+        ms = statistics.median(t[module][1] for t in times) / 1000
+        over = ms > args.budget_ms
+        failed |= over
+        print(f"import {module}: {ms:.0f} ms (budget {args.budget_ms:.0f} ms){' OVER' if over else ''}")
+
+    eager = runs[-1][1]
+    if eager != "[]":
+        failed = True
+        print(f"imported at startup but meant to be lazy: {eager}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Load test that replays realistic HTMX game flows against a local server.
+
+Each virtual user loads the home page, fetches the score table, adds 2-6
+players and plays 13 rounds of score updates, keeping its own session
+cookie. Reports requests/s and p50/p95/p99 latency per route and can save
+the results as JSON for comparison across commits.
+
+    python -m benchmarks.load_test --users 20 --games 3
+    python -m benchmarks.load_test --output before.json
+    python -m benchmarks.load_test --compare before.json
+
+By default the app is started with uvicorn on 127.0.0.1 with its databases
+in a temp directory; pass --url to target a server that is already running.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import quote, urlencode, urlsplit
+from models import categories, fixed_scores
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAYER_NAMES = ["Anna", "Ben", "Clara", "David", "Eva", "Felix"]
+
+
+class VirtualUser:
+    """One browser: a keep-alive connection and its session cookie."""
+
+    def __init__(self, host, port, record):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookies = {}
+        self.record = record
+
+    def request(self, method, path, route, data=None, htmx=True):
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if htmx:
+            headers["HX-Request"] = "true"
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        started = time.perf_counter()
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        content = response.read()
+        elapsed = time.perf_counter() - started
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        self.record(route, elapsed, response.status, len(content))
+        return response.status
+
+    def play_game(self, rng):
+        self.request("GET", "/", "GET /", htmx=False)
+        self.request("GET", "/score-table", "GET /score-table")
+        players = rng.sample(PLAYER_NAMES, rng.randint(2, 6))
+        for name in players:
+            self.request("POST", "/add-user", "POST /add-user", {"username": name})
+        for category in categories:
+            for name in players:
+                if category in fixed_scores:
+                    value = rng.choice([str(fixed_scores[category]), "0"])
+                else:
+                    value = str(rng.randint(0, 30))
+                self.request(
+                    "POST",
+                    f"/update-score/{quote(name)}/{quote(category)}",
+                    "POST /update-score/{user}/{category}",
+                    {"value": value},
+                )
+        self.request("POST", "/reset-scores", "POST /reset-scores")
+
+    def close(self):
+        self.conn.close()
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, duration):
+    """Per-route and overall throughput and latency (ms) from raw samples."""
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for route, elapsed, status, _ in samples:
+        by_route[route].append(elapsed)
+        if status >= 400:
+            errors[route] += 1
+    by_route["ALL"] = [elapsed for _, elapsed, _, _ in samples]
+    errors["ALL"] = sum(errors.values())
+
+    report = {}
+    for route, values in sorted(by_route.items()):
+        values.sort()
+        report[route] = {
+            "requests": len(values),
+            "errors": errors[route],
+            "rps": round(len(values) / duration, 1),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return report
+
+
+def run_load(host, port, users, games, seed):
+    """Run `users` concurrent virtual users, each playing `games` games."""
+    samples = []
+    lock = threading.Lock()
+
+    def record(route, elapsed, status, size):
+        with lock:
+            samples.append((route, elapsed, status, size))
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user = VirtualUser(host, port, record)
+        try:
+            for _ in range(games):
+                user.play_game(rng)
+        finally:
+            user.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    return summarize(samples, duration), duration
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, data_dir):
+    """Start the app with uvicorn and wait until it accepts connections."""
+    env = {
+        **os.environ,
+        "ANALYTICS_DB": os.path.join(data_dir, "analytics.db"),
+        "GAME_STATE_DB": os.path.join(data_dir, "game_state.db"),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    header = f"{'route':<40} {'reqs':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for route, stats in report.items():
+        line = (
+            f"{route:<40} {stats['requests']:>6} {stats['errors']:>4} {stats['rps']:>8} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+        old = (baseline or {}).get(route)
+        if old and old["p95_ms"]:
+            line += f"   p95 {(stats['p95_ms'] / old['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--games", type=int, default=2, help="games per virtual user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.url:
+            target = urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+        else:
+            host, port = "127.0.0.1", free_port()
+            server = start_server(port, data_dir)
+        try:
+            report, duration = run_load(host, port, args.users, args.games, args.seed)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+    print(f"{args.users} users x {args.games} games in {duration:.1f}s")
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "timestamp": datetime.now().isoformat(),
+                    "users": args.users,
+                    "games": args.games,
+                    "duration_s": round(duration, 2),
+                    "routes": report,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,27 @@
 """Game UI components."""
+import hashlib
+from functools import lru_cache
 from fasthtml.common import *
 from models import categories, fixed_scores
-from services.game import calculate_scores
+from services.scoreboard import category_index
+from services.strategy import get_table
+from components.prerender import prerendered
+
+
+@prerendered
+def FixedScoreOptions(category, value):
+    """
+    Get the options of the select for a fixed-score category with `value` selected.
+    """
+    return (
+        Option("", value="", selected=value is None),
+        Option(
+            "Gewürfelt",
+            value=str(fixed_scores[category]),
+            selected=value == fixed_scores[category],
+        ),
+        Option("Gestrichen", value="0", selected=value == 0),
+    )
 
 
 def ScoreInput(user, category, value):
@@ -11,19 +31,13 @@ def ScoreInput(user, category, value):
     common_attrs = {
         "name": "value",
         "hx_post": f"/update-score/{user}/{category}",
-        "hx_target": "#score-table-container",
+        "hx_target": "closest td",
         "hx_swap": "outerHTML",
         "cls": "w-full p-1 text-sm border border-gray-300 min-w-0",
     }
     if category in fixed_scores:
         return Select(
-            Option("", value="", selected=value is None),
-            Option(
-                "Gewürfelt",
-                value=str(fixed_scores[category]),
-                selected=value == fixed_scores[category],
-            ),
-            Option("Gestrichen", value="0", selected=value == 0),
+            FixedScoreOptions(category, value),
             hx_trigger="change",
             **common_attrs,
         )
@@ -35,27 +49,131 @@ def ScoreInput(user, category, value):
     )
 
 
-def ScoreTable(session):
+total_labels = [
+    ("Oberer Teil Summe", "upper_total"),
+    ("Bonus (bei 63 oder mehr)", "bonus"),
+    ("Gesamtsumme", "total"),
+]
+
+
+@prerendered
+def CategoryLabelCell(category):
     """
-    Get the score table HTML element for the game.
+    Get the first cell of a category row: the name and its description tooltip.
     """
-    users, scores = session.get("users", []), session.get("scores", {})
-    if not users:
-        return Div(
-            Div("🎲", cls="text-6xl mb-4"),
-            Div("Noch keine Spieler", cls="text-lg font-semibold text-gray-700 mb-2"),
+    return Td(
+        Div(
+            Span(category, cls="mr-1 text-sm"),
+            Span(
+                "ⓘ",
+                cls="cursor-pointer text-xs",
+                **{
+                    "@mouseenter": "tooltip = true",
+                    "@mouseleave": "tooltip = false",
+                },
+            ),
             Div(
-                "Füge oben Spieler hinzu, um das Spiel zu beginnen", cls="text-gray-500"
+                categories[category],
+                cls="absolute bg-gray-800 text-white p-2 rounded shadow-md z-10 mt-1 text-xs w-48",
+                x_show="tooltip",
             ),
-            cls="flex flex-col items-center justify-center py-16 text-center",
-            id="score-table",
-        )
+            cls="relative",
+        ),
+        cls="border border-gray-200 p-1",
+        x_data="{ tooltip: false }",
+    )
+
+
+@prerendered
+def TotalLabelCell(label):
+    """
+    Get the first cell of a totals row.
+    """
+    return Td(label, cls="border border-gray-200 p-2 font-bold text-sm")
+
+
+@prerendered
+def EmptyScoreTable():
+    """
+    Get the placeholder shown instead of the score table before anyone joins.
+    """
+    return Div(
+        Div("🎲", cls="text-6xl mb-4"),
+        Div("Noch keine Spieler", cls="text-lg font-semibold text-gray-700 mb-2"),
+        Div("Füge oben Spieler hinzu, um das Spiel zu beginnen", cls="text-gray-500"),
+        cls="flex flex-col items-center justify-center py-16 text-center",
+        id="score-table",
+    )
+
+
+@lru_cache(maxsize=1024)
+def player_key(user):
+    """
+    Get the id fragment for a user's cells. It depends only on the name, so
+    out-of-band swaps into a table rendered before another tab added,
+    removed or reordered players still land in that user's cells.
+    """
+    return hashlib.blake2s(user.encode(), digest_size=6).hexdigest()
+
+
+def ScoreCell(user, category, value, **kwargs):
+    """
+    Get the table cell holding the score input for one user and category.
+    """
+    return Td(
+        ScoreInput(user, category, value),
+        cls="border border-gray-200 p-1",
+        id=f"score-{player_key(user)}-{category_index[category]}",
+        **kwargs,
+    )
+
+
+def MissingCell(user, missing, **kwargs):
+    """
+    Get the table cell listing the categories a user has not filled yet.
+    """
+    return Td(
+        Div(
+            *[
+                Div(
+                    cat,
+                    cls="bg-gray-100 text-gray-600 text-xs font-normal mr-1 px-2 py-0.5 rounded",
+                )
+                for cat in missing
+            ],
+            cls="flex flex-wrap gap-1",
+        ),
+        cls="border border-gray-200 p-2",
+        id=f"missing-{player_key(user)}",
+        **kwargs,
+    )
+
 
-    def get_missing_categories(user_scores):
-        """
-        Get the missing categories for a user to display in the score table.
-        """
-        return [cat for cat in categories if user_scores.get(cat) is None]
+def TotalCell(user, i, value, **kwargs):
+    """
+    Get the table cell for one of a user's totals (upper sum, bonus, total).
+    """
+    return Td(
+        str(value),
+        cls="border border-gray-200 p-2 font-bold text-sm",
+        id=f"total-{player_key(user)}-{i}",
+        **kwargs,
+    )
+
+
+def ScoreTable(game):
+    """
+    Get the score table HTML element for the game.
+    Constant parts (row labels, tooltips, select options, the empty state)
+    come from the render cache; only the per-player cells are built here.
+    """
+    users = game.users
+    if not users:
+        return EmptyScoreTable()
+
+    # Score each player once per render; the totals rows and the missing
+    # categories row all read from these cards
+    cards = [game.score_card(user) for user in users]
 
     return Table(
         Thead(
@@ -85,73 +203,29 @@ def ScoreTable(session):
             Tr(
                 Td("Fehlende", cls="border border-gray-200 p-2 text-gray-500 text-sm"),
                 *[
-                    Td(
-                        Div(
-                            *[
-                                Div(
-                                    cat,
-                                    cls="bg-gray-100 text-gray-600 text-xs font-normal mr-1 px-2 py-0.5 rounded",
-                                )
-                                for cat in get_missing_categories(scores.get(user, {}))
-                            ],
-                            cls="flex flex-wrap gap-1",
-                        ),
-                        cls="border border-gray-200 p-2",
-                    )
-                    for user in users
+                    MissingCell(user, card.missing)
+                    for user, card in zip(users, cards)
                 ],
             ),
             *[
                 Tr(
-                    Td(
-                        Div(
-                            Span(category, cls="mr-1 text-sm"),
-                            Span(
-                                "ⓘ",
-                                cls="cursor-pointer text-xs",
-                                **{
-                                    "@mouseenter": "tooltip = true",
-                                    "@mouseleave": "tooltip = false",
-                                },
-                            ),
-                            Div(
-                                description,
-                                cls="absolute bg-gray-800 text-white p-2 rounded shadow-md z-10 mt-1 text-xs w-48",
-                                x_show="tooltip",
-                            ),
-                            cls="relative",
-                        ),
-                        cls="border border-gray-200 p-1",
-                        x_data="{ tooltip: false }",
-                    ),
+                    CategoryLabelCell(category),
                     *[
-                        Td(
-                            ScoreInput(
-                                user, category, scores.get(user, {}).get(category)
-                            ),
-                            cls="border border-gray-200 p-1",
-                        )
+                        ScoreCell(user, category, game.get(user, category))
                         for user in users
                     ],
                 )
-                for category, description in categories.items()
+                for category in categories
             ],
             *[
                 Tr(
-                    Td(label, cls="border border-gray-200 p-2 font-bold text-sm"),
+                    TotalLabelCell(label),
                     *[
-                        Td(
-                            str(value),
-                            cls="border border-gray-200 p-2 font-bold text-sm",
-                        )
-                        for value in [
-                            calculate_scores(scores.get(user, {}))[i] for user in users
-                        ]
+                        TotalCell(user, i, getattr(card, field))
+                        for user, card in zip(users, cards)
                     ],
                 )
-                for i, label in enumerate(
-                    ["Oberer Teil Summe", "Bonus (bei 63 oder mehr)", "Gesamtsumme"]
-                )
+                for i, (label, field) in enumerate(total_labels)
             ],
         ),
         cls="w-full border-collapse bg-white text-sm",
@@ -159,14 +233,49 @@ def ScoreTable(session):
     )
 
 
-def ScoreTableContainer(session):
+def ScoreUpdate(game, user, category):
+    """
+    Get the fragments that change when one score is edited: the edited cell,
+    plus out-of-band swaps for the user's missing categories and totals.
+    """
+    card = game.score_card(user)
+    return (
+        ScoreCell(user, category, game.get(user, category)),
+        MissingCell(user, card.missing, hx_swap_oob="true"),
+        *[
+            TotalCell(user, i, getattr(card, field), hx_swap_oob="true")
+            for i, (_, field) in enumerate(total_labels)
+        ],
+    )
+
+
+def ScoreUpdates(game, edits):
+    """
+    Get out-of-band swaps for several `(user, category)` edits: each edited
+    cell once, and each edited user's missing categories and totals once.
+    """
+    fragments = [
+        ScoreCell(user, category, game.get(user, category), hx_swap_oob="true")
+        for user, category in dict.fromkeys(edits)
+    ]
+    for user in dict.fromkeys(user for user, _ in edits):
+        card = game.score_card(user)
+        fragments.append(MissingCell(user, card.missing, hx_swap_oob="true"))
+        fragments.extend(
+            TotalCell(user, i, getattr(card, field), hx_swap_oob="true")
+            for i, (_, field) in enumerate(total_labels)
+        )
+    return tuple(fragments)
+
+
+def ScoreTableContainer(game):
     """
     Get the score table container HTML element for the game.
     It contains the score table, a reset button, and a container for the score table.
     """
-    has_players = bool(session.get("users"))
+    has_players = bool(game.users)
     return Div(
-        Div(ScoreTable(session), cls="overflow-x-auto"),
+        Div(ScoreTable(game), cls="overflow-x-auto"),
         Button(
             "Punktestand zurücksetzen",
             hx_post="/reset-scores",
@@ -177,11 +286,69 @@ def ScoreTableContainer(session):
         )
         if has_players
         else None,
+        BestMoveForm(game.users) if has_players and get_table() else None,
         cls="bg-white rounded-lg p-6",
         id="score-table-container",
     )
 
 
+def BestMoveForm(users):
+    """
+    Form that asks the advisor which category a player should fill with a roll.
+    """
+    return Form(
+        Select(
+            *[Option(user, value=user) for user in users],
+            name="user",
+            cls="border border-gray-300 rounded p-2",
+        ),
+        Input(
+            type="text",
+            name="dice",
+            placeholder="Würfel, z.B. 66612",
+            inputmode="numeric",
+            required=True,
+            cls="border border-gray-300 rounded p-2 w-40",
+        ),
+        Button(
+            "Tipp",
+            type="submit",
+            cls="bg-blue-500 hover:bg-blue-600 text-white p-2 rounded transition duration-300 ease-in-out",
+        ),
+        BestMove(),
+        hx_post="/best-move",
+        hx_target="#best-move",
+        hx_swap="outerHTML",
+        cls="mt-4 flex flex-wrap items-center gap-2",
+    )
+
+
+def BestMove(user=None, moves=(), error=None):
+    """
+    The advisor's answer: the best open category for the roll and the next
+    best alternatives, with the points each scores now.
+    """
+    if error:
+        content = Span(error, cls="text-red-500")
+    elif user is None:
+        content = None
+    elif not moves:
+        content = f"{user} hat alle Kategorien ausgefüllt"
+    else:
+        (category, points, _), *others = moves
+        content = (
+            Span(f"Tipp für {user}: "),
+            Strong(f"{category} ({points} Punkte)"),
+            Span(
+                ", sonst " + ", ".join(f"{c} ({p})" for c, p, _ in others[:2]),
+                cls="text-gray-500",
+            )
+            if others
+            else None,
+        )
+    return Div(content, id="best-move", cls="text-sm")
+
+
 def AddPlayerForm():
     return Form(
         Div(
@@ -194,7 +361,7 @@ def AddPlayerForm():
             Button(
                 "Hinzufügen",
                 type="submit",
-                onclick="plausible('Add')",
+                onclick="window.trackEvent?.('ui_add_player')",
                 cls="bg-blue-500 hover:bg-blue-600 text-lg text-white p-2 rounded-r transition duration-300 ease-in-out disabled:bg-gray-400 disabled:cursor-not-allowed",
             ),
             cls="flex",
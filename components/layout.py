@@ -1,5 +1,6 @@
 """Layout components for the application."""
 from fasthtml.common import *
+from components.prerender import prerendered
 
 
 def Navbar():
@@ -39,6 +40,7 @@ def Hero():
     )
 
 
+@prerendered
 def Header():
     style = """
     background-color: #3b82f6;
@@ -59,7 +61,7 @@ def Banner():
         Span(cls="mr-1")("🎲 Online-Kniffel.de gibt es bald auch als App."),
         A(
             href="#",
-            onclick="plausible('More')",
+            onclick="window.trackEvent?.('ui_more_info')",
             cls="text-blue-500 hover:opacity-70 transition-all",
         )("Erfahre mehr →"),
     )
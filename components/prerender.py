@@ -0,0 +1,39 @@
+"""Render cache for components whose output never changes."""
+import functools
+import sys
+from contextlib import contextmanager
+from fasthtml.common import to_xml
+
+_components = []
+
+
+def prerendered(component, maxsize=256):
+    """
+    Serialize `component(*args)` to HTML once per distinct `args` and return
+    the cached string. `to_xml` marks it safe, so FT trees splice it in as-is.
+
+    Only use this for components that are pure functions of hashable
+    arguments. The undecorated component stays available as `__wrapped__`.
+    """
+
+    def render(*args):
+        return to_xml(component(*args))
+
+    cached = functools.update_wrapper(functools.lru_cache(maxsize=maxsize)(render), component)
+    _components.append(cached)
+    return cached
+
+
+@contextmanager
+def disabled():
+    """
+    Put the undecorated components back in their modules, e.g. to measure the
+    cache. Names imported elsewhere with `from ... import` are not affected.
+    """
+    for cached in _components:
+        setattr(sys.modules[cached.__module__], cached.__name__, cached.__wrapped__)
+    try:
+        yield
+    finally:
+        for cached in _components:
+            setattr(sys.modules[cached.__module__], cached.__name__, cached)
@@ -1,10 +1,80 @@
 """Configuration and constants for the Kniffel application."""
 import os
-from pathlib import Path
-
-# Ensure data directory exists
-Path("data").mkdir(exist_ok=True)
 
 # Analytics database setup
-ANALYTICS_DB = "data/analytics.db"
+ANALYTICS_DB = os.environ.get("ANALYTICS_DB", "data/analytics.db")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "kniffel-admin-123")
+
+# Background analytics writer: queue bound, events per transaction, max seconds
+# an event may wait before it is written
+ANALYTICS_QUEUE_SIZE = int(os.environ.get("ANALYTICS_QUEUE_SIZE", "10000"))
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", "200"))
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", "1.0"))
+
+# Analytics retention: events are stored in partitions of
+# ANALYTICS_PARTITION_DAYS days (1 = daily, 7 = weekly); a background job
+# drops partitions older than ANALYTICS_RETENTION_DAYS every
+# ANALYTICS_RETENTION_INTERVAL seconds
+ANALYTICS_RETENTION_DAYS = int(os.environ.get("ANALYTICS_RETENTION_DAYS", "28"))
+ANALYTICS_RETENTION_INTERVAL = float(os.environ.get("ANALYTICS_RETENTION_INTERVAL", "3600"))
+ANALYTICS_PARTITION_DAYS = int(os.environ.get("ANALYTICS_PARTITION_DAYS", "1"))
+
+# Dashboard session counts: "exact" counts the session rollup, "sketch" merges
+# per-hour HyperLogLog sketches of 2**ANALYTICS_HLL_PRECISION registers, whose
+# relative standard error is 1.04 / sqrt(2**precision) (1.6% at 12)
+ANALYTICS_SESSION_COUNTING = os.environ.get("ANALYTICS_SESSION_COUNTING", "exact")
+ANALYTICS_HLL_PRECISION = int(os.environ.get("ANALYTICS_HLL_PRECISION", "12"))
+
+# Browser analytics beacons (POST /events/batch): at most
+# ANALYTICS_BEACON_MAX_EVENTS events in ANALYTICS_BEACON_MAX_BYTES per batch and
+# ANALYTICS_BEACON_RATE batches per session per minute in each worker process
+ANALYTICS_BEACON_MAX_EVENTS = int(os.environ.get("ANALYTICS_BEACON_MAX_EVENTS", "50"))
+ANALYTICS_BEACON_MAX_BYTES = int(os.environ.get("ANALYTICS_BEACON_MAX_BYTES", "8192"))
+ANALYTICS_BEACON_RATE = int(os.environ.get("ANALYTICS_BEACON_RATE", "12"))
+
+# The admin dashboard's summary is cached for ANALYTICS_SUMMARY_TTL seconds
+# per process, then served stale while it is recomputed (0 = no cache)
+ANALYTICS_SUMMARY_TTL = float(os.environ.get("ANALYTICS_SUMMARY_TTL", "30"))
+
+# Server-side game state: "sqlite" (persistent, shared by workers) or "memory"
+# (in-process LRU). Games untouched for GAME_STATE_TTL_DAYS are purged.
+GAME_STATE_BACKEND = os.environ.get("GAME_STATE_BACKEND", "sqlite")
+GAME_STATE_DB = os.environ.get("GAME_STATE_DB", "data/game_state.db")
+GAME_STATE_MAX_ENTRIES = int(os.environ.get("GAME_STATE_MAX_ENTRIES", "10000"))
+GAME_STATE_TTL_DAYS = int(os.environ.get("GAME_STATE_TTL_DAYS", "365"))
+
+# Analytics SQLite tuning. The database runs in WAL mode; these set the
+# durability level, page cache (KiB), memory-mapped I/O (bytes), how long to
+# wait for a lock (ms) and how many read connections each process keeps
+ANALYTICS_SYNCHRONOUS = os.environ.get("ANALYTICS_SYNCHRONOUS", "NORMAL")
+ANALYTICS_CACHE_SIZE_KB = int(os.environ.get("ANALYTICS_CACHE_SIZE_KB", "8192"))
+ANALYTICS_MMAP_SIZE = int(os.environ.get("ANALYTICS_MMAP_SIZE", str(64 * 1024 * 1024)))
+ANALYTICS_BUSY_TIMEOUT_MS = int(os.environ.get("ANALYTICS_BUSY_TIMEOUT_MS", "5000"))
+ANALYTICS_READ_POOL_SIZE = int(os.environ.get("ANALYTICS_READ_POOL_SIZE", "4"))
+
+# Request timing: requests slower than TIMING_SLOW_MS are kept in a ring
+# buffer of TIMING_SLOW_BUFFER entries for the admin timing page
+TIMING_SLOW_MS = float(os.environ.get("TIMING_SLOW_MS", "100"))
+TIMING_SLOW_BUFFER = int(os.environ.get("TIMING_SLOW_BUFFER", "50"))
+
+# Response compression: text responses of at least COMPRESSION_MIN_SIZE bytes
+# are compressed with the best codec the client accepts (zstd, brotli, gzip);
+# each codec has its own level scale
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "500"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# Production serving (`python main.py <port> --prod`): WEB_WORKERS pre-forked
+# worker processes (0 = one per CPU). On shutdown each worker gets
+# WEB_GRACEFUL_TIMEOUT seconds to finish requests and flush analytics
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "0"))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+
+# X-Forwarded-For/-Proto are only trusted from these comma-separated proxy
+# addresses ("*" trusts every client, which lets them spoof IP and scheme)
+WEB_FORWARDED_ALLOW_IPS = os.environ.get("WEB_FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Best-move advisor: strategy table written by `python -m services.strategy_solver`
+# and memory-mapped by the server; the advisor is hidden while it is missing
+STRATEGY_TABLE = os.environ.get("STRATEGY_TABLE", "strategy.bin")
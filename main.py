@@ -8,15 +8,22 @@ All business logic is organized in:
 - services/: Business logic (game scoring, analytics)
 - components/: UI components
 - routes/: HTTP route handlers
+
+    python main.py [port]          # development: one process, live reload
+    python main.py [port] --prod   # production: WEB_WORKERS pre-forked workers
 """
+import os
+import signal
+import socket
 import sys
+import time
+import traceback
 
 # Import app (triggers route registration via app.py imports)
 from app import app
-
-# Initialize analytics database on startup
+from config import WEB_FORWARDED_ALLOW_IPS, WEB_GRACEFUL_TIMEOUT, WEB_WORKERS
 from services.analytics import init_analytics_db
-init_analytics_db()
+from services.analytics_db import close_all
 
 # Get port from command line, but only if it looks like a port number
 port = 5001
@@ -26,6 +33,153 @@ if len(sys.argv) > 1:
     except ValueError:
         pass  # Not a valid port, use default
 
+
+def worker_count():
+    """WEB_WORKERS if set, otherwise one worker per CPU."""
+    return WEB_WORKERS or os.cpu_count() or 1
+
+
+def _preload():
+    """
+    One-time work done in the parent before forking: schema migration, the
+    cached home page and the mapped strategy table, whose memory workers then
+    share copy-on-write.
+    """
+    init_analytics_db()
+    # Workers must not inherit open SQLite connections
+    close_all()
+    from routes.main import home_page
+    from services.strategy import get_table
+
+    home_page.get()
+    get_table()
+
+
+# A worker that fails within EARLY_EXIT seconds of starting is restarted
+# after an exponential backoff; after MAX_EARLY_EXITS such failures in a row
+# (bad config, unreachable database, ...) the server gives up
+EARLY_EXIT = 10
+MAX_EARLY_EXITS = 5
+
+
+def restart_delay(early_exits):
+    """Seconds to wait before restarting a worker, or None to give up."""
+    if early_exits >= MAX_EARLY_EXITS:
+        return None
+    return min(2 ** early_exits - 1, 30)
+
+
+def _run_worker(sock, background_jobs):
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    # Periodic jobs (retention, game purge) run in a single worker
+    app.state.background_jobs = background_jobs
+    # "auto" picks uvloop and httptools when they are installed
+    config = uvicorn.Config(
+        app,
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        timeout_graceful_shutdown=WEB_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=WEB_FORWARDED_ALLOW_IPS,
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    if not server.started:
+        # e.g. a lifespan startup hook failed; uvicorn has logged why
+        sys.exit(3)
+
+
+def _exit_with(run):
+    """
+    Run `run()` in a forked child and end the process: status 0 after a
+    normal return, the requested status on SystemExit, otherwise 1 with the
+    traceback printed. The child must never return into the parent's loop.
+    """
+    code = 1
+    try:
+        run()
+        code = 0
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve_workers(port, workers):
+    """
+    Pre-fork server: bind once, preload, then fork `workers` uvicorn processes
+    that accept on the shared socket. SIGTERM/SIGINT are passed on to the
+    workers, whose lifespan shutdown flushes their queued analytics events.
+    Workers that exit on their own are replaced, with a growing delay if
+    they keep failing right after they start.
+    """
+    _preload()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    print(f"Serving on http://0.0.0.0:{port} with {workers} workers")
+
+    children = {}
+    started = {}
+    early_exits = 0
+    stopping = failed = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            _exit_with(lambda: _run_worker(sock, background_jobs=index == 0))
+        children[pid] = index
+        started[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    while children:
+        pid, status = os.wait()
+        index = children.pop(pid, None)
+        uptime = time.monotonic() - started.pop(pid, 0)
+        if index is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        failed_early = code != 0 and uptime < EARLY_EXIT
+        early_exits = early_exits + 1 if failed_early else 0
+        delay = restart_delay(early_exits)
+        if delay is None:
+            print("Workers keep failing right after starting; shutting down")
+            failed = True
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"Worker {pid} exited with status {code}; restarting in {delay}s")
+        time.sleep(delay)
+        if not stopping:
+            spawn(index)
+    sock.close()
+    if failed:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    from fasthtml.common import serve
-    serve(port=port)
+    if "--prod" in sys.argv:
+        serve_workers(port, worker_count())
+    else:
+        from fasthtml.common import serve
+
+        # The analytics schema is set up by the first request that uses it
+        serve(port=port)
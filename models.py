@@ -27,3 +27,7 @@ fixed_scores = {
 
 # Upper section categories
 upper_section = ["Einser", "Zweier", "Dreier", "Vierer", "Fünfer", "Sechser"]
+
+# Upper section bonus: 35 points once the upper categories add up to 63
+upper_bonus_threshold = 63
+upper_bonus = 35
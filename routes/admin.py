@@ -2,9 +2,25 @@
 import os
 from datetime import datetime
 from fasthtml.common import *
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
 from app import rt
 from config import ADMIN_PASSWORD, ANALYTICS_DB
-from services.analytics import get_analytics_summary, reset_analytics
+from services.analytics import get_cached_analytics_summary, reset_analytics, flush_events
+from services.timing import stats as timing_stats, PHASES
+from services.export import (
+    snapshot_database,
+    remove_file,
+    iter_file,
+    iter_events,
+    gzip_chunks,
+)
+
+export_media_types = {
+    "db": "application/octet-stream",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
 
 
 def format_number(n):
@@ -67,7 +83,7 @@ def get(session):
     if auth_check:
         return auth_check
     
-    stats = get_analytics_summary()
+    stats, computed_at = get_cached_analytics_summary()
 
     if "error" in stats:
         return (
@@ -79,6 +95,9 @@ def get(session):
             ),
         )
 
+    # HyperLogLog session counts are estimates
+    approx = "≈ " if stats.get("sessions_estimated") else ""
+
     # Build event type breakdown
     event_type_rows = [
         Tr(Td(event_type), Td(str(count), cls="text-right"))
@@ -113,7 +132,16 @@ def get(session):
     return (
         Title("Analytics Dashboard - Kniffel"),
         Div(
-            H1("📊 Kniffel Analytics Dashboard", cls="text-3xl font-bold mb-6"),
+            H1("📊 Kniffel Analytics Dashboard", cls="text-3xl font-bold mb-2"),
+            P(
+                f"Computed at {datetime.fromtimestamp(computed_at).strftime('%d.%m.%Y %H:%M:%S')}",
+                cls="text-sm text-gray-500 mb-4",
+            ),
+            A(
+                "Request Timing →",
+                href="/admin/timing",
+                cls="text-blue-500 hover:text-blue-700 inline-block mb-6",
+            ),
             # Summary Cards
             Div(
                 Div(
@@ -123,7 +151,7 @@ def get(session):
                 ),
                 Div(
                     H2("Unique Sessions", cls="text-gray-600 text-sm"),
-                    P(format_number(stats["unique_sessions"]), cls="text-3xl font-bold"),
+                    P(approx + format_number(stats["unique_sessions"]), cls="text-3xl font-bold"),
                     P(
                         f"since {datetime.fromisoformat(stats['earliest_event']).strftime('%d.%m.%Y')}"
                         if stats.get("earliest_event")
@@ -134,7 +162,7 @@ def get(session):
                 ),
                 Div(
                     H2("Sessions (24h)", cls="text-gray-600 text-sm"),
-                    P(format_number(stats["recent_sessions_24h"]), cls="text-3xl font-bold"),
+                    P(approx + format_number(stats["recent_sessions_24h"]), cls="text-3xl font-bold"),
                     cls="bg-white p-4 rounded shadow",
                 ),
                 Div(
@@ -198,13 +226,23 @@ def get(session):
                 ),
                 cls="bg-white p-4 rounded shadow mb-8",
             ),
-            # Download button
+            # Download buttons
             Div(
                 A(
                     "Download Database",
                     href="/admin/download",
                     cls="bg-green-500 hover:bg-green-600 text-white p-3 rounded inline-block",
                 ),
+                A(
+                    "Export CSV",
+                    href="/admin/download?format=csv&gzip=1",
+                    cls="bg-green-500 hover:bg-green-600 text-white p-3 rounded inline-block ml-2",
+                ),
+                A(
+                    "Export NDJSON",
+                    href="/admin/download?format=ndjson&gzip=1",
+                    cls="bg-green-500 hover:bg-green-600 text-white p-3 rounded inline-block ml-2",
+                ),
                 Form(
                     Button(
                         "Reset Analytics",
@@ -224,27 +262,169 @@ def get(session):
 
 
 @rt("/admin/download")
-def get(session):
-    """Download the analytics database."""
+def get(session, format: str = "db", gzip: bool = False):
+    """
+    Download the analytics data as a SQLite snapshot or as CSV/NDJSON.
+    The response is streamed; pass `gzip=1` to compress it on the fly.
+    """
     auth_check = require_admin(session)
     if auth_check:
         return auth_check
     
     if not os.path.exists(ANALYTICS_DB):
         return Response("Database not found", status_code=404)
+    if format not in export_media_types:
+        return Response("Unknown export format", status_code=400)
 
-    with open(ANALYTICS_DB, "rb") as f:
-        content = f.read()
+    flush_events()
+    background = None
+    if format == "db":
+        snapshot = snapshot_database(ANALYTICS_DB)
+        # Deleted once the response has been sent, even if the client
+        # disconnects before the generator finishes
+        chunks = iter_file(snapshot)
+        background = BackgroundTask(remove_file, snapshot)
+    else:
+        chunks = iter_events(format, ANALYTICS_DB)
 
-    return Response(
-        content,
-        media_type="application/octet-stream",
-        headers={
-            "Content-Disposition": f"attachment; filename=kniffel_analytics_{datetime.now().strftime('%Y%m%d')}.db"
-        },
+    filename = f"kniffel_analytics_{datetime.now().strftime('%Y%m%d')}.{format}"
+    media_type = export_media_types[format]
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        background=background,
     )
 
 
+@rt("/admin/timing")
+def get(session):
+    """Per-route latency histograms and recent slow requests for this process."""
+    auth_check = require_admin(session)
+    if auth_check:
+        return auth_check
+
+    route_rows = [
+        Tr(
+            Td(route, cls="font-mono text-sm"),
+            Td(str(rs.count), cls="text-right"),
+            Td(f"{rs.total_ms / rs.count:.1f}", cls="text-right"),
+            Td(f"≤{rs.quantile(0.5):g}", cls="text-right"),
+            Td(f"≤{rs.quantile(0.95):g}", cls="text-right"),
+            Td(f"≤{rs.quantile(0.99):g}", cls="text-right"),
+            Td(f"{rs.max_ms:.1f}", cls="text-right"),
+            *[
+                Td(f"{rs.phase_ms[name] / rs.count:.2f}", cls="text-right")
+                for name in PHASES
+            ],
+        )
+        for route, rs in sorted(
+            timing_stats.routes.items(), key=lambda item: -item[1].total_ms
+        )
+        if rs.count
+    ]
+
+    slow_rows = [
+        Tr(
+            Td(req["time"].strftime("%d.%m. %H:%M:%S")),
+            Td(req["path"], cls="font-mono text-sm"),
+            Td(str(req["status"]), cls="text-right"),
+            Td(f"{req['phases'].get('total', 0):.1f}", cls="text-right"),
+            *[
+                Td(f"{req['phases'].get(name, 0):.2f}", cls="text-right")
+                for name in PHASES
+            ],
+        )
+        for req in sorted(
+            timing_stats.slow_requests,
+            key=lambda req: -req["phases"].get("total", 0),
+        )
+    ]
+    phase_headers = [Th(name.replace("_", " "), cls="text-right") for name in PHASES]
+
+    return (
+        Title("Request Timing - Kniffel"),
+        Div(
+            H1("⏱ Request Timing", cls="text-3xl font-bold mb-2"),
+            P(
+                "Per process since start, all times in ms. Percentiles are histogram bucket bounds.",
+                cls="text-gray-500 mb-2",
+            ),
+            A(
+                "← Analytics Dashboard",
+                href="/admin/dashboard",
+                cls="text-blue-500 hover:text-blue-700 inline-block mb-6",
+            ),
+            Div(
+                H2("Routes", cls="text-xl font-bold mb-4"),
+                Table(
+                    Thead(
+                        Tr(
+                            Th("Route"),
+                            Th("Count", cls="text-right"),
+                            Th("Avg", cls="text-right"),
+                            Th("p50", cls="text-right"),
+                            Th("p95", cls="text-right"),
+                            Th("p99", cls="text-right"),
+                            Th("Max", cls="text-right"),
+                            *phase_headers,
+                        )
+                    ),
+                    Tbody(*route_rows),
+                    cls="w-full",
+                ),
+                cls="bg-white p-4 rounded shadow mb-8 overflow-x-auto",
+            ),
+            Div(
+                H2(
+                    f"Slow Requests (≥ {timing_stats.slow_ms:g} ms)",
+                    cls="text-xl font-bold mb-4",
+                ),
+                Table(
+                    Thead(
+                        Tr(
+                            Th("Time"),
+                            Th("Path"),
+                            Th("Status", cls="text-right"),
+                            Th("Total", cls="text-right"),
+                            *phase_headers,
+                        )
+                    ),
+                    Tbody(*slow_rows),
+                    cls="w-full",
+                ),
+                cls="bg-white p-4 rounded shadow mb-8 overflow-x-auto",
+            ),
+            Form(
+                Button(
+                    "Reset Timing",
+                    type="submit",
+                    cls="bg-red-500 hover:bg-red-600 text-white p-3 rounded",
+                ),
+                action="/admin/timing/reset",
+                method="post",
+            ),
+            cls="container mx-auto p-6 bg-gray-50 min-h-screen",
+        ),
+    )
+
+
+@rt("/admin/timing/reset")
+def post(session):
+    """Clear the timing statistics of this process."""
+    auth_check = require_admin(session)
+    if auth_check:
+        return auth_check
+
+    timing_stats.reset()
+    return Redirect("/admin/timing")
+
+
 @rt("/admin/reset")
 def post(session):
     """Reset the analytics database."""
@@ -0,0 +1,47 @@
+"""Endpoint for analytics events buffered in the browser."""
+import json
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+from app import app
+from config import ANALYTICS_BEACON_MAX_BYTES, ANALYTICS_BEACON_MAX_EVENTS
+from services.analytics import beacon_allowed, log_client_events
+from services.game_state import load_game
+
+
+def _store(session, events):
+    # load_game only reads; a session without a game gets an unsaved empty one
+    log_client_events(session, load_game(session), events)
+
+
+async def events_batch(req):
+    """
+    Store a batch of events sent by `navigator.sendBeacon`: a JSON array of
+    `[type, age_ms]` or `[type, age_ms, category]` items.
+    """
+    session = req.session
+    body = b""
+    async for chunk in req.stream():
+        body += chunk
+        if len(body) > ANALYTICS_BEACON_MAX_BYTES:
+            return Response(status_code=413)
+    try:
+        events = json.loads(body)
+    except ValueError:
+        return Response(status_code=400)
+    if not isinstance(events, list):
+        return Response(status_code=400)
+    if len(events) > ANALYTICS_BEACON_MAX_EVENTS:
+        return Response(status_code=413)
+    if not beacon_allowed(session):
+        return Response(status_code=429)
+
+    # The database write runs off the event loop
+    await run_in_threadpool(_store, session, events)
+    return Response(status_code=204)
+
+
+# A plain Starlette route: FastHTML handlers parse the whole body as a form
+# (or JSON object) before they run, which a JSON array does not survive and
+# which would defeat the size limit above
+app.router.routes.append(Route("/events/batch", events_batch, methods=["POST"]))
@@ -1,9 +1,12 @@
 """Game routes for player and score management."""
 from fasthtml.common import *
 from app import rt, add_toast
-from components.game import ScoreTableContainer
-from services.analytics import log_event
-from models import fixed_scores
+from components.game import BestMove, ScoreTableContainer, ScoreUpdate, ScoreUpdates
+from services.analytics import log_event, log_events
+from services.game_state import load_game, save_game
+from services.scoreboard import EMPTY
+from services.strategy import get_table, parse_dice
+from models import categories, fixed_scores
 
 
 @rt("/add-user")
@@ -11,14 +14,15 @@ def post(session, username: str):
     """
     Add a user to the game.
     """
-    users = session.get("users", [])
-    if username and username not in users:
-        users.append(username.strip())
-        session["users"] = users
-        log_event(session, "player_added")
+    username = username.strip()
+    game = load_game(session)
+    if username and username not in game.users:
+        game.add_user(username)
+        save_game(session, game)
+        log_event(session, game, "player_added")
 
     add_toast(session, f"{username} wurde hinzugefügt", "success")
-    return ScoreTableContainer(session)
+    return ScoreTableContainer(game)
 
 
 @rt("/delete-user/{username}")
@@ -26,16 +30,12 @@ def post(session, username: str):
     """
     Delete a user from the game.
     """
-    users = session.get("users", [])
-    if username in users:
-        users.remove(username)
-        session["users"] = users
-        scores = session.get("scores", {})
-        if username in scores:
-            del scores[username]
-            session["scores"] = scores
-        log_event(session, "player_removed")
-    return ScoreTableContainer(session)
+    game = load_game(session)
+    if username in game.users:
+        game.remove_user(username)
+        save_game(session, game)
+        log_event(session, game, "player_removed")
+    return ScoreTableContainer(game)
 
 
 @rt("/score-table")
@@ -43,40 +43,88 @@ def get(session):
     """
     Get the score table container HTML element for the game.
     """
-    return ScoreTableContainer(session)
+    return ScoreTableContainer(load_game(session))
+
+
+def _parse_score(category, value):
+    """
+    Get the score stored for the form `value` in `category`, and the
+    `(event_type, category, value)` the edit is logged as.
+    Raises ValueError if a free-entry value is not a number or does not fit
+    the scoreboard's 32-bit cells (whose lowest value marks an empty cell).
+    """
+    if value == "":
+        return None, ("score_cleared", category, None)
+    if category in fixed_scores:
+        if value == "0":  # "Gestrichen"
+            return 0, ("score_crossed_out", category, 0)
+        # "Gewürfelt"
+        score = fixed_scores[category]
+        return score, ("score_entered", category, score)
+    try:
+        score = int(float(value))
+    except OverflowError:
+        raise ValueError(f"Score out of range: {value}") from None
+    if not EMPTY < score < 2**31:
+        raise ValueError(f"Score out of range: {value}")
+    return score, ("score_entered", category, score)
+
+
+def _rerender(game):
+    """Replace the whole container, e.g. when the page shows an outdated table."""
+    return (
+        ScoreTableContainer(game),
+        HtmxResponseHeaders(retarget="#score-table-container", reswap="outerHTML"),
+    )
 
 
 @rt("/update-score/{user}/{category}")
 def post(session, user: str, category: str, value: str):
     """
     Update the score for a user and category.
+    Only the edited cell and the user's missing categories and totals are
+    returned; if the table is out of date the whole container is re-rendered.
     """
-    scores = session.get("scores", {})
-    scores.setdefault(user, {})
+    game = load_game(session)
+    if user not in game.users or category not in categories:
+        return _rerender(game)
 
-    if value == "":
-        scores[user][category] = None
-        log_event(session, "score_cleared", category=category)
-    elif category in fixed_scores:
-        if value == "0":  # "Gestrichen"
-            scores[user][category] = 0
-            log_event(session, "score_crossed_out", category=category, value=0)
-        else:  # "Gewürfelt"
-            scores[user][category] = fixed_scores[category]
-            log_event(
-                session,
-                "score_entered",
-                category=category,
-                value=fixed_scores[category],
-            )
-    else:
-        int_value = int(float(value)) if value else None
-        scores[user][category] = int_value
-        if int_value is not None:
-            log_event(session, "score_entered", category=category, value=int_value)
-
-    session["scores"] = scores
-    return ScoreTableContainer(session)
+    try:
+        score, (event_type, _, event_value) = _parse_score(category, value)
+    except ValueError:
+        return _rerender(game)
+    game.set(user, category, score)
+    log_event(session, game, event_type, category=category, value=event_value)
+    save_game(session, game)
+    return ScoreUpdate(game, user, category)
+
+
+@rt("/update-scores")
+def post(session, user: list[str], category: list[str], value: list[str]):
+    """
+    Apply several score edits at once: the i-th `user`, `category` and
+    `value` fields form one edit, with the same rules as /update-score.
+    Either every edit is applied or, if any is invalid, none is and the
+    container is re-rendered. The response holds only out-of-band swaps.
+    """
+    game = load_game(session)
+    if not len(user) == len(category) == len(value):
+        return _rerender(game)
+    edits = []
+    for edit_user, edit_category, edit_value in zip(user, category, value):
+        if edit_user not in game.users or edit_category not in categories:
+            return _rerender(game)
+        try:
+            score, event = _parse_score(edit_category, edit_value)
+        except ValueError:
+            return _rerender(game)
+        edits.append((edit_user, edit_category, score, event))
+
+    for edit_user, edit_category, score, _ in edits:
+        game.set(edit_user, edit_category, score)
+    log_events(session, game, [event for *_, event in edits])
+    save_game(session, game)
+    return ScoreUpdates(game, [edit[:2] for edit in edits])
 
 
 @rt("/reset-scores")
@@ -84,6 +132,25 @@ def post(session):
     """
     Reset the scores for all users.
     """
-    session["scores"] = {user: {} for user in session.get("users", [])}
-    log_event(session, "scores_reset")
-    return ScoreTableContainer(session)
+    game = load_game(session)
+    game.reset()
+    save_game(session, game)
+    log_event(session, game, "scores_reset")
+    return ScoreTableContainer(game)
+
+
+@rt("/best-move")
+def post(session, user: str, dice: str):
+    """
+    Suggest the category `user` should fill with a final roll of `dice`.
+    """
+    game = load_game(session)
+    table = get_table()
+    if table is None or user not in game.users:
+        return BestMove(error="Kein Tipp verfügbar")
+    try:
+        roll = parse_dice(dice)
+    except ValueError:
+        return BestMove(error="Bitte fünf Würfel von 1 bis 6 eingeben, z.B. 66612")
+    scores = {category: game.get(user, category) for category in categories}
+    return BestMove(user, table.rank(scores, roll))
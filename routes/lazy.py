@@ -0,0 +1,47 @@
+"""Route modules that are imported on the first request they serve."""
+import importlib
+import threading
+from starlette.routing import BaseRoute, Match, NoMatchFound
+
+# Modules that must only be imported on first use, not at startup: the admin
+# routes (see app.py), markdown rendering, schema migration and exports
+LAZY_MODULES = ("mistletoe", "routes.admin", "services.analytics_schema", "services.export")
+
+
+class LazyRoutes(BaseRoute):
+    """
+    Stand-in for the routes of `module` under `prefix`.
+
+    The first request for a path under `prefix` imports the module, which
+    registers its handlers on the app as usual. The stand-in then removes
+    itself from `router` and the request is routed again.
+    """
+
+    def __init__(self, router, prefix, module):
+        self.router = router
+        self.prefix = prefix.rstrip("/")
+        self.module = module
+        # FastHTML compares these when it registers a route
+        self.path, self.name, self.methods = self.prefix, module, None
+        self._lock = threading.Lock()
+
+    def matches(self, scope):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path == self.prefix or path.startswith(self.prefix + "/"):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def load(self):
+        """Import the module and take the stand-in out of the routing table."""
+        with self._lock:
+            importlib.import_module(self.module)
+            if self in self.router.routes:
+                self.router.routes.remove(self)
+
+    async def handle(self, scope, receive, send):
+        self.load()
+        await self.router(scope, receive, send)
+
+    def url_path_for(self, name, /, **path_params):
+        raise NoMatchFound(name, path_params)
@@ -1,25 +1,17 @@
 """Main page routes."""
-import mistletoe
 from fasthtml.common import *
-from app import rt
+from app import app, rt
 from components.layout import Header, MyCard
-from components.game import AddPlayerForm, ScoreTableContainer
+from components.game import AddPlayerForm
+from services.assets import preload_links
+from services.content import RenderedFile
 
 
-@rt("/")
-def get(session):
+def HomeContent(content_html):
     """
-    Get the main page HTML element for the game.
-    It contains the title, description, and a form to add players.
+    Get the static body of the home page around the rendered markdown.
     """
-
-    # read in content.md with the content for the home page
-    with open("content.md", "r", encoding="utf-8") as file:
-        md_content = file.read()
-    content_html = mistletoe.markdown(md_content)
-
     return (
-        Title("online-kniffel.de - Kniffelblock online"),
         Header(),
         Div(
             Div(
@@ -70,3 +62,34 @@ def get(session):
             )
         ),
     )
+
+
+def render_home(md_content):
+    """Render content.md into the home page body."""
+    # mistletoe is slow to import and only needed when content.md changes
+    import mistletoe
+
+    return to_xml(HomeContent(mistletoe.markdown(md_content)))
+
+
+# The home page body is rendered once from content.md and re-rendered only
+# when the file changes
+home_page = RenderedFile("content.md", render_home, salt=to_xml(tuple(app.hdrs)))
+
+
+@rt("/")
+def get(req):
+    """
+    Get the main page HTML element for the game.
+    It contains the title, description, and a form to add players.
+    """
+    page = home_page.get()
+    if page.is_fresh(req.headers):
+        return Response(status_code=304, headers=page.headers)
+
+    return (
+        Title("online-kniffel.de - Kniffelblock online"),
+        NotStr(page.html),
+        *[HttpHeader(k, v) for k, v in page.headers.items()],
+        HttpHeader("Link", preload_links()),
+    )
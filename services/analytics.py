@@ -2,211 +2,503 @@
 import sqlite3
 import json
 import hashlib
-import random
+import logging
+import math
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
-from config import ANALYTICS_DB
+from datetime import datetime
+from functools import lru_cache
+from config import (
+    ANALYTICS_DB,
+    ANALYTICS_QUEUE_SIZE,
+    ANALYTICS_BATCH_SIZE,
+    ANALYTICS_FLUSH_INTERVAL,
+    ANALYTICS_RETENTION_DAYS,
+    ANALYTICS_RETENTION_INTERVAL,
+    ANALYTICS_SESSION_COUNTING,
+    ANALYTICS_SUMMARY_TTL,
+    ANALYTICS_BEACON_RATE,
+)
+from models import categories
+from services.analytics_db import connections, close_all
+from services.analytics_writer import AnalyticsWriter
+from services.cache import RefreshingCache
+from services.partitions import (
+    drop_partition,
+    events_subquery,
+    expired_partitions,
+    insert_events,
+    partitions,
+    union_sql,
+)
+from services.rollups import (
+    init_rollups,
+    refresh_rollups,
+    expire_partition,
+    clear_rollups,
+    read_summary,
+)
+from services.scheduler import PeriodicJob
+from services.timing import phase
+
+logger = logging.getLogger(__name__)
+
+
+# Databases whose schema is current in this process. Forked workers inherit
+# it, so a database set up before the fork is not migrated again
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def _db():
+    """Connection manager for the analytics database, set up on first use."""
+    if ANALYTICS_DB not in _ready:
+        with _ready_lock:
+            if ANALYTICS_DB not in _ready:
+                init_analytics_db()
+    return connections(ANALYTICS_DB)
 
 
 def init_analytics_db():
-    """Initialize the analytics database with events table."""
-    conn = sqlite3.connect(ANALYTICS_DB)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_hash TEXT NOT NULL,
-            event_type TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            player_count INTEGER,
-            categories_filled INTEGER,
-            category TEXT,
-            value INTEGER,
-            metadata TEXT
-        )
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_session_hash ON events(session_hash)
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_timestamp ON events(timestamp)
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_event_type ON events(event_type)
-    """)
-    conn.commit()
-    conn.close()
+    """Create or migrate the analytics schema and bring the rollups up to date."""
+    from services.analytics_schema import migrate
+
+    with connections(ANALYTICS_DB).writer() as conn:
+        migrate(conn)
+        init_rollups(conn)
+    _ready.add(ANALYTICS_DB)
 
 
 def cleanup_old_events():
-    """Remove events older than 28 days."""
-    conn = sqlite3.connect(ANALYTICS_DB)
-    cutoff = (datetime.now() - timedelta(days=28)).isoformat()
-    conn.execute("DELETE FROM events WHERE timestamp < ?", (cutoff,))
-    conn.commit()
-    conn.close()
+    """
+    Remove events older than the retention window.
+
+    Events are partitioned by period, so this drops every partition that lies
+    entirely before the cutoff, each in its own short transaction. Freed pages
+    are returned with an incremental vacuum. Returns the number of rows and
+    partitions removed and the time taken.
+    """
+    started = time.perf_counter()
+    cutoff = int(time.time()) - ANALYTICS_RETENTION_DAYS * 86400
+    with _db().writer() as conn:
+        expired = expired_partitions(conn, cutoff)
+    rows_removed = 0
+    for name in expired:
+        with _db().writer() as conn:
+            rows_removed += expire_partition(conn, name)
+    with _db().writer() as conn:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+
+    report = {
+        "rows_removed": rows_removed,
+        "partitions_dropped": len(expired),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info(
+        "Analytics retention removed %d events (%d partitions) in %.1f ms",
+        report["rows_removed"],
+        report["partitions_dropped"],
+        report["duration_ms"],
+    )
+    return report
+
+
+_retention_job = PeriodicJob(
+    "analytics-retention", cleanup_old_events, ANALYTICS_RETENTION_INTERVAL
+)
+
+
+@lru_cache(maxsize=4096)
+def _hash_session_id(session_id):
+    return hashlib.sha256(session_id.encode()).hexdigest()[:8]
 
 
 def get_session_hash(session):
     """Generate an anonymized hash for the session."""
     if "session_id" not in session:
         session["session_id"] = str(uuid.uuid4())
-    return hashlib.sha256(session["session_id"].encode()).hexdigest()[:8]
+    return _hash_session_id(session["session_id"])
+
+
+# Dictionary ids per database, so each event type and category name is
+# looked up once per process. Ids are only cached once the transaction that
+# inserted them has committed; a rolled-back id could later go to another name
+_dictionary_ids = {}
+
+
+def _dictionary_id(conn, table, name, new_ids):
+    if name is None:
+        return None
+    key = (ANALYTICS_DB, table, name)
+    if key in _dictionary_ids:
+        return _dictionary_ids[key]
+    if key not in new_ids:
+        conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+        new_ids[key] = conn.execute(
+            f"SELECT id FROM {table} WHERE name = ?", (name,)
+        ).fetchone()[0]
+    return new_ids[key]
+
+
+def _write_events(rows):
+    """
+    Insert a batch of events in a single transaction. Rows hold names for the
+    event type and category, which are coded to dictionary ids here; each row
+    goes to the partition for its timestamp.
+    """
+    new_ids = {}
+    with _db().writer() as conn:
+        insert_events(
+            conn,
+            [
+                (
+                    session_hash,
+                    _dictionary_id(conn, "event_types", event_type, new_ids),
+                    ts,
+                    player_count,
+                    categories_filled,
+                    _dictionary_id(conn, "categories", category, new_ids),
+                    value,
+                    metadata,
+                )
+                for (
+                    session_hash,
+                    event_type,
+                    ts,
+                    player_count,
+                    categories_filled,
+                    category,
+                    value,
+                    metadata,
+                ) in rows
+            ],
+        )
+        refresh_rollups(conn)
+    _dictionary_ids.update(new_ids)
 
 
-def count_filled_categories(scores):
-    """Count total filled categories across all players."""
-    total = 0
-    for user_scores in scores.values():
-        total += sum(1 for v in user_scores.values() if v is not None)
-    return total
+_writer = AnalyticsWriter(
+    _write_events,
+    queue_size=ANALYTICS_QUEUE_SIZE,
+    batch_size=ANALYTICS_BATCH_SIZE,
+    flush_interval=ANALYTICS_FLUSH_INTERVAL,
+)
 
 
-def log_event(session, event_type, category=None, value=None, extra_metadata=None):
-    """Log an analytics event to the database."""
+def log_event(session, game, event_type, category=None, value=None, extra_metadata=None):
+    """Queue an analytics event for the background writer."""
+    with phase("analytics"):
+        _log_event(session, game, event_type, category, value, extra_metadata)
+
+
+def log_events(session, game, events):
+    """
+    Queue several `(event_type, category, value)` events from one request.
+    They share a timestamp and the game state after the whole batch.
+    """
+    with phase("analytics"):
+        try:
+            session_hash = get_session_hash(session)
+            now = int(time.time())
+            player_count, categories_filled = len(game.users), game.filled_count()
+            for event_type, category, value in events:
+                _writer.enqueue(
+                    (
+                        session_hash,
+                        event_type,
+                        now,
+                        player_count,
+                        categories_filled,
+                        category,
+                        value,
+                        None,
+                    )
+                )
+        except Exception:
+            # Silently fail - analytics should not break the app
+            pass
+
+
+def _log_event(session, game, event_type, category, value, extra_metadata):
     try:
-        # Cleanup old events periodically (1% chance)
-        if random.random() < 0.01:
-            cleanup_old_events()
-
-        conn = sqlite3.connect(ANALYTICS_DB)
-        users = session.get("users", [])
-        scores = session.get("scores", {})
-
-        metadata = extra_metadata or {}
-        if category:
-            metadata["category"] = category
-        if value is not None:
-            metadata["value"] = value
-
-        conn.execute(
-            """
-            INSERT INTO events 
-            (session_hash, event_type, timestamp, player_count, categories_filled, category, value, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        # category and value have their own columns; metadata only holds extras
+        _writer.enqueue(
             (
                 get_session_hash(session),
                 event_type,
-                datetime.now().isoformat(),
-                len(users),
-                count_filled_categories(scores),
+                int(time.time()),
+                len(game.users),
+                game.filled_count(),
                 category,
                 value,
-                json.dumps(metadata) if metadata else None,
-            ),
+                json.dumps(extra_metadata) if extra_metadata else None,
+            )
         )
-        conn.commit()
-        conn.close()
     except Exception:
         # Silently fail - analytics should not break the app
         pass
 
 
+# Event types the browser may send to /events/batch
+CLIENT_EVENT_TYPES = frozenset({"ui_add_player", "ui_more_info"})
+# Client events carry their age rather than a timestamp, so the browser's
+# clock does not matter; older ones are stored as this many seconds old
+_CLIENT_MAX_AGE = 3600
+
+
+def _client_event_rows(session, game, events, now):
+    rows = []
+    for event in events:
+        if not isinstance(event, list) or not 2 <= len(event) <= 3:
+            continue
+        event_type, age_ms, *category = event
+        category = category[0] if category else None
+        if (
+            not isinstance(event_type, str)
+            or event_type not in CLIENT_EVENT_TYPES
+            or not isinstance(age_ms, (int, float))
+            or isinstance(age_ms, bool)
+            # json.loads accepts NaN and Infinity
+            or (isinstance(age_ms, float) and not math.isfinite(age_ms))
+            or not (category is None or isinstance(category, str))
+            or (category is not None and category not in categories)
+        ):
+            continue
+        # Clamped before dividing, as JSON integers can be arbitrarily large
+        age = min(max(age_ms, 0), _CLIENT_MAX_AGE * 1000) / 1000
+        rows.append(
+            (
+                get_session_hash(session),
+                event_type,
+                int(now - age),
+                len(game.users),
+                game.filled_count(),
+                category,
+                None,
+                None,
+            )
+        )
+    return rows
+
+
+def log_client_events(session, game, events):
+    """
+    Store a batch of browser events in one transaction. Each event is
+    `[type, age_ms]` or `[type, age_ms, category]`; invalid ones are skipped.
+    Returns the number of events stored.
+    """
+    with phase("analytics"):
+        rows = _client_event_rows(session, game, events, time.time())
+        if not rows:
+            return 0
+        try:
+            _write_events(rows)
+        except Exception:
+            logger.exception("Storing %d client events failed", len(rows))
+            return 0
+        return len(rows)
+
+
+# Beacon batches per session hash in the current minute
+_beacon_counts = {}
+_beacon_minute = None
+_beacon_lock = threading.Lock()
+
+
+def beacon_allowed(session):
+    """Count a beacon batch; False once the session sent ANALYTICS_BEACON_RATE this minute."""
+    global _beacon_minute
+    key = get_session_hash(session)
+    minute = int(time.time()) // 60
+    with _beacon_lock:
+        if minute != _beacon_minute:
+            _beacon_minute = minute
+            _beacon_counts.clear()
+        _beacon_counts[key] = _beacon_counts.get(key, 0) + 1
+        return _beacon_counts[key] <= ANALYTICS_BEACON_RATE
+
+
+def flush_events():
+    """Write all queued events to the database before returning."""
+    _writer.flush()
+
+
+def start_analytics():
+    """Start the background analytics jobs."""
+    _retention_job.start()
+
+
+def shutdown_analytics():
+    """Stop the background jobs, flushing pending events first."""
+    _retention_job.stop()
+    _writer.stop()
+    close_all()
+
+
+def dropped_events():
+    """Number of events dropped because the queue was full."""
+    return _writer.dropped
+
+
+def _read_summary():
+    with _db().reader() as conn:
+        return read_summary(
+            conn,
+            int(time.time()) - 24 * 3600,
+            sketches=ANALYTICS_SESSION_COUNTING == "sketch",
+        )
+
+
 def get_analytics_summary():
-    """Get summary statistics from analytics database."""
+    """Get summary statistics from the pre-aggregated rollups."""
     try:
-        conn = sqlite3.connect(ANALYTICS_DB)
-        conn.row_factory = sqlite3.Row
-
-        # Total events
-        total_events = conn.execute("SELECT COUNT(*) as count FROM events").fetchone()[
-            "count"
-        ]
-
-        # Unique sessions
-        unique_sessions = conn.execute(
-            "SELECT COUNT(DISTINCT session_hash) as count FROM events"
-        ).fetchone()["count"]
-
-        # Events by type
-        events_by_type = conn.execute("""
-            SELECT event_type, COUNT(*) as count 
-            FROM events 
-            GROUP BY event_type 
-            ORDER BY count DESC
-        """).fetchall()
-
-        # Recent sessions (last 24h)
-        recent_cutoff = (datetime.now() - timedelta(hours=24)).isoformat()
-        recent_sessions = conn.execute(
-            """
-            SELECT COUNT(DISTINCT session_hash) as count 
-            FROM events 
-            WHERE timestamp > ?
-        """,
-            (recent_cutoff,),
-        ).fetchone()["count"]
-
-        # Player count distribution (count sessions by max players, not every event)
-        player_distribution = conn.execute("""
-            SELECT max_player_count, COUNT(*) as count
-            FROM (
-                SELECT session_hash, MAX(player_count) as max_player_count
-                FROM events
-                WHERE event_type = 'player_added'
-                GROUP BY session_hash
-            )
-            GROUP BY max_player_count
-            ORDER BY max_player_count
-        """).fetchall()
-
-        # Category popularity
-        category_stats = conn.execute("""
-            SELECT category, COUNT(*) as count,
-                   SUM(CASE WHEN event_type = 'score_crossed_out' THEN 1 ELSE 0 END) as crossed_out
-            FROM events 
-            WHERE category IS NOT NULL
-            GROUP BY category
-            ORDER BY count DESC
-        """).fetchall()
-
-        # Session completion stats
-        session_stats = conn.execute("""
-            SELECT 
-                AVG(categories_filled) as avg_categories,
-                MAX(categories_filled) as max_categories,
-                COUNT(CASE WHEN categories_filled >= 13 THEN 1 END) as completed_sessions
-            FROM (
-                SELECT session_hash, MAX(categories_filled) as categories_filled
-                FROM events
-                GROUP BY session_hash
-            )
-        """).fetchone()
-
-        # Earliest event timestamp
-        earliest_event = conn.execute(
-            "SELECT MIN(timestamp) as timestamp FROM events"
-        ).fetchone()
-
-        conn.close()
-
-        return {
-            "total_events": total_events,
-            "unique_sessions": unique_sessions,
-            "recent_sessions_24h": recent_sessions,
-            "events_by_type": [(r["event_type"], r["count"]) for r in events_by_type],
-            "player_distribution": [
-                (r["max_player_count"], r["count"]) for r in player_distribution
-            ],
-            "category_stats": [
-                (r["category"], r["count"], r["crossed_out"]) for r in category_stats
-            ],
-            "avg_categories": round(session_stats["avg_categories"] or 0, 1),
-            "max_categories": session_stats["max_categories"] or 0,
-            "completed_sessions": session_stats["completed_sessions"] or 0,
-            "earliest_event": earliest_event["timestamp"] if earliest_event else None,
-        }
+        return _read_summary()
     except Exception as e:
         return {"error": str(e)}
 
 
+_summary_cache = RefreshingCache(
+    _read_summary, ANALYTICS_SUMMARY_TTL, name="analytics-summary"
+)
+
+
+def get_cached_analytics_summary():
+    """
+    Get the summary for the dashboard from a cache that is refreshed in the
+    background after ANALYTICS_SUMMARY_TTL seconds. Returns the summary and
+    the epoch time it was computed at (None on error).
+    """
+    try:
+        return _summary_cache.get()
+    except Exception as e:
+        return {"error": str(e)}, None
+
+
+def get_exact_analytics_summary():
+    """Get summary statistics by scanning the events table."""
+    try:
+        with _db().reader() as conn:
+            return _exact_summary(conn)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _exact_summary(conn):
+    """
+    Run the full-scan summary queries on `conn`. Each query reads only the
+    columns it needs from each partition.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+
+    def events(*columns, since=None):
+        return events_subquery(conn, *columns, since=since)
+
+    # Total events
+    total_events = cursor.execute(
+        f"SELECT COUNT(*) as count FROM {events('id')}"
+    ).fetchone()["count"]
+
+    # Unique sessions
+    unique_sessions = cursor.execute(
+        f"SELECT COUNT(DISTINCT session_hash) as count FROM {events('session_hash')}"
+    ).fetchone()["count"]
+
+    # Events by type
+    events_by_type = cursor.execute(f"""
+        SELECT t.name as event_type, COUNT(*) as count 
+        FROM {events('event_type_id')} e
+        JOIN event_types t ON t.id = e.event_type_id
+        GROUP BY e.event_type_id 
+        ORDER BY count DESC, t.name
+    """).fetchall()
+
+    # Recent sessions (last 24h), from the partitions that overlap the window
+    recent_cutoff = int(time.time()) - 24 * 3600
+    recent_sessions = cursor.execute(
+        f"""
+        SELECT COUNT(DISTINCT session_hash) as count 
+        FROM {events('session_hash', 'ts', since=recent_cutoff)} 
+        WHERE ts > ?
+    """,
+        (recent_cutoff,),
+    ).fetchone()["count"]
+
+    # Player count distribution (count sessions by max players, not every event)
+    player_distribution = cursor.execute(f"""
+        SELECT max_player_count, COUNT(*) as count
+        FROM (
+            SELECT session_hash, MAX(player_count) as max_player_count
+            FROM {events('event_type_id', 'session_hash', 'player_count')}
+            WHERE event_type_id = (SELECT id FROM event_types WHERE name = 'player_added')
+            GROUP BY session_hash
+        )
+        GROUP BY max_player_count
+        ORDER BY max_player_count
+    """).fetchall()
+
+    # Category popularity
+    category_stats = cursor.execute(f"""
+        SELECT c.name as category, COUNT(*) as count,
+               SUM(CASE WHEN t.name = 'score_crossed_out' THEN 1 ELSE 0 END) as crossed_out
+        FROM {events('category_id', 'event_type_id')} e
+        JOIN categories c ON c.id = e.category_id
+        JOIN event_types t ON t.id = e.event_type_id
+        GROUP BY e.category_id
+        ORDER BY count DESC, c.name
+    """).fetchall()
+
+    # Session completion stats
+    session_stats = cursor.execute(f"""
+        SELECT 
+            AVG(categories_filled) as avg_categories,
+            MAX(categories_filled) as max_categories,
+            COUNT(CASE WHEN categories_filled >= 13 THEN 1 END) as completed_sessions
+        FROM (
+            SELECT session_hash, MAX(categories_filled) as categories_filled
+            FROM {events('session_hash', 'categories_filled')}
+            GROUP BY session_hash
+        )
+    """).fetchone()
+
+    # Earliest event timestamp; partitions are never empty, so it is in the oldest
+    oldest = partitions(conn)[:1]
+    earliest_event = cursor.execute(
+        f"SELECT MIN(ts) as ts FROM ({union_sql(oldest, ['ts'])})"
+    ).fetchone()["ts"]
+
+    return {
+        "total_events": total_events,
+        "unique_sessions": unique_sessions,
+        "recent_sessions_24h": recent_sessions,
+        "sessions_estimated": False,
+        "events_by_type": [(r["event_type"], r["count"]) for r in events_by_type],
+        "player_distribution": [
+            (r["max_player_count"], r["count"]) for r in player_distribution
+        ],
+        "category_stats": [
+            (r["category"], r["count"], r["crossed_out"]) for r in category_stats
+        ],
+        "avg_categories": round(session_stats["avg_categories"] or 0, 1),
+        "max_categories": session_stats["max_categories"] or 0,
+        "completed_sessions": session_stats["completed_sessions"] or 0,
+        "earliest_event": (
+            datetime.fromtimestamp(earliest_event).isoformat()
+            if earliest_event is not None
+            else None
+        ),
+    }
+
+
 def reset_analytics():
     """Reset all analytics data."""
     try:
-        conn = sqlite3.connect(ANALYTICS_DB)
-        conn.execute("DELETE FROM events")
-        conn.commit()
-        conn.close()
+        with _db().writer() as conn:
+            for name in partitions(conn):
+                drop_partition(conn, name)
+            clear_rollups(conn)
+        _summary_cache.invalidate()
         return True
     except Exception:
         return False
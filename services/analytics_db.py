@@ -0,0 +1,124 @@
+"""Managed SQLite connections for the analytics database.
+
+The database runs in WAL mode so dashboard reads do not block event writes
+and the other way round. Each process keeps one writer connection, used
+under a lock, and a small pool of reusable read connections.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import (
+    ANALYTICS_SYNCHRONOUS,
+    ANALYTICS_CACHE_SIZE_KB,
+    ANALYTICS_MMAP_SIZE,
+    ANALYTICS_BUSY_TIMEOUT_MS,
+    ANALYTICS_READ_POOL_SIZE,
+)
+
+
+class ConnectionManager:
+    """One writer connection and a pool of reader connections for a database file."""
+
+    def __init__(self, path, pool_size=ANALYTICS_READ_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._write_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Connections must not be shared with a forked child, so every process
+        # opens its own
+        self._pid = os.getpid()
+        self._writer = None
+        self._readers = queue.LifoQueue(maxsize=self.pool_size)
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def connect(self, readonly=False):
+        """Open a new connection with the tuned pragmas applied."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=ANALYTICS_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {ANALYTICS_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = {-int(ANALYTICS_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size = {int(ANALYTICS_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(ANALYTICS_BUSY_TIMEOUT_MS)}")
+        if readonly:
+            conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """
+        Use the writer connection exclusively. Statements run in a transaction
+        that is committed on success and rolled back on error.
+        """
+        self._check_pid()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self.connect()
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def reader(self):
+        """Borrow a pooled read connection; all reads see one consistent snapshot."""
+        self._check_pid()
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self.connect(readonly=True)
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            conn.rollback()
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Close every connection held by this process."""
+        self._check_pid()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def connections(path):
+    """Return the connection manager for a database file."""
+    manager = _managers.get(path)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.setdefault(path, ConnectionManager(path))
+    return manager
+
+
+def close_all():
+    """Close all managed connections."""
+    for manager in list(_managers.values()):
+        manager.close()
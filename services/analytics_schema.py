@@ -0,0 +1,220 @@
+"""Versioned schema for the analytics database.
+
+The schema version is kept in `PRAGMA user_version`. `migrate` applies every
+migration above the current version, so a fresh database and an existing
+`data/analytics.db` end up with the same schema. To migrate a file by hand:
+
+    python -m services.analytics_schema data/analytics.db
+"""
+import sqlite3
+import sys
+from datetime import datetime
+from models import categories
+from services.partitions import (
+    create_catalog,
+    create_partition,
+    partition_bounds,
+    rebuild_view,
+)
+
+EVENT_TYPES = [
+    "player_added",
+    "player_removed",
+    "score_entered",
+    "score_cleared",
+    "score_crossed_out",
+    "scores_reset",
+]
+
+
+def _v1_legacy_events(conn):
+    """Text-coded events table with ISO-8601 timestamps (the original schema)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_hash TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            player_count INTEGER,
+            categories_filled INTEGER,
+            category TEXT,
+            value INTEGER,
+            metadata TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_hash ON events(session_hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON events(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_type ON events(event_type)")
+
+
+def _iso_to_epoch(value):
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def _v2_integer_coded_events(conn):
+    """
+    Dictionary tables for event types and categories, epoch-second
+    timestamps, and metadata without the category/value already in columns.
+    Existing rows are converted; the derived rollups are rebuilt afterwards.
+    """
+    conn.execute("""
+        CREATE TABLE event_types (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO event_types (name) VALUES (?)", [(n,) for n in EVENT_TYPES]
+    )
+    conn.executemany(
+        "INSERT INTO categories (name) VALUES (?)", [(n,) for n in categories]
+    )
+    conn.execute("""
+        INSERT OR IGNORE INTO event_types (name) SELECT DISTINCT event_type FROM events
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO categories (name)
+        SELECT DISTINCT category FROM events WHERE category IS NOT NULL
+    """)
+
+    conn.execute("""
+        CREATE TABLE events_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_hash TEXT NOT NULL,
+            event_type_id INTEGER NOT NULL REFERENCES event_types(id),
+            ts INTEGER NOT NULL,
+            player_count INTEGER,
+            categories_filled INTEGER,
+            category_id INTEGER REFERENCES categories(id),
+            value INTEGER,
+            metadata TEXT
+        )
+    """)
+    conn.create_function("iso_to_epoch", 1, _iso_to_epoch, deterministic=True)
+    conn.execute("""
+        INSERT INTO events_v2
+        (id, session_hash, event_type_id, ts, player_count, categories_filled, category_id, value, metadata)
+        SELECT e.id, e.session_hash, t.id, iso_to_epoch(e.timestamp), e.player_count,
+               e.categories_filled, c.id, e.value,
+               NULLIF(json_remove(e.metadata, '$.category', '$.value'), '{}')
+        FROM events e
+        JOIN event_types t ON t.name = e.event_type
+        LEFT JOIN categories c ON c.name = e.category
+    """)
+    conn.execute("DROP TABLE events")
+    conn.execute("ALTER TABLE events_v2 RENAME TO events")
+    conn.execute("CREATE INDEX idx_session_hash ON events(session_hash)")
+    conn.execute("CREATE INDEX idx_ts ON events(ts)")
+    conn.execute("CREATE INDEX idx_event_type ON events(event_type_id)")
+
+    # Readable view for exports
+    conn.execute("""
+        CREATE VIEW events_readable AS
+        SELECT e.id, e.session_hash, t.name AS event_type,
+               datetime(e.ts, 'unixepoch', 'localtime') AS timestamp,
+               e.player_count, e.categories_filled, c.name AS category,
+               e.value, e.metadata
+        FROM events e
+        JOIN event_types t ON t.id = e.event_type_id
+        LEFT JOIN categories c ON c.id = e.category_id
+    """)
+
+    # Rollups are derived from events; drop them so they are rebuilt
+    for table in ["rollup_sessions", "rollup_categories", "rollup_hourly", "rollup_state"]:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _v3_dashboard_indexes(conn):
+    """
+    Composite indexes that cover the dashboard queries. Each replaces a
+    single-column index that is a prefix of it.
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_session_hash")
+    conn.execute("DROP INDEX IF EXISTS idx_ts")
+    conn.execute("DROP INDEX IF EXISTS idx_event_type")
+    # Distinct sessions since T, retention (ts < cutoff)
+    conn.execute("CREATE INDEX idx_events_ts_session ON events(ts, session_hash)")
+    # Max player_count per session for player_added, in session order
+    conn.execute("""
+        CREATE INDEX idx_events_type_session_players
+        ON events(event_type_id, session_hash, player_count)
+    """)
+    # Category popularity with crossed-out counts
+    conn.execute(
+        "CREATE INDEX idx_events_category_type ON events(category_id, event_type_id)"
+    )
+    # Per-session progress, and rollup recomputation by session
+    conn.execute(
+        "CREATE INDEX idx_events_session_filled ON events(session_hash, categories_filled)"
+    )
+
+
+def _v4_time_partitions(conn):
+    """
+    Move events into per-period partition tables behind an `events` view, so
+    retention can drop whole partitions. Ids are kept, so the rollups stay valid.
+    """
+    last_id = conn.execute("""
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'events'), 0),
+            COALESCE((SELECT MAX(id) FROM events), 0)
+        )
+    """).fetchone()[0]
+    create_catalog(conn, last_id)
+    periods = {
+        partition_bounds(ts)
+        for (ts,) in conn.execute("SELECT DISTINCT ts FROM events").fetchall()
+    }
+    for start, end in sorted(periods):
+        name = create_partition(conn, start, end)
+        conn.execute(
+            f"INSERT INTO {name} SELECT * FROM events WHERE ts >= ? AND ts < ?",
+            (start, end),
+        )
+    conn.execute("DROP TABLE events")
+    rebuild_view(conn)
+
+
+MIGRATIONS = [
+    (1, _v1_legacy_events),
+    (2, _v2_integer_coded_events),
+    (3, _v3_dashboard_indexes),
+    (4, _v4_time_partitions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION, one transaction per migration."""
+    # Incremental auto-vacuum lets retention hand freed pages back to the OS;
+    # switching an existing database over requires a one-time VACUUM
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/analytics.db"
+    connection = sqlite3.connect(path)
+    print(f"{path}: schema version {migrate(connection)}")
+    connection.close()
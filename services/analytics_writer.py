@@ -0,0 +1,109 @@
+"""Background writer that batches analytics events into SQLite."""
+import atexit
+import queue
+import threading
+import time
+
+# Queue markers understood by the writer thread
+_STOP = object()
+
+
+class AnalyticsWriter:
+    """
+    Bounded in-memory queue drained by a daemon thread.
+
+    Events are collected into batches and handed to `insert` (which writes
+    them in a single transaction) once `batch_size` events are pending or
+    `flush_interval` seconds have passed since the first pending event.
+    """
+
+    def __init__(self, insert, queue_size=10000, batch_size=200, flush_interval=1.0):
+        self.insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._atexit_registered = False
+
+    def enqueue(self, row):
+        """Queue a row for writing; count it as dropped if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Block until every event queued so far has been written."""
+        if not self.running:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """Write pending events and stop the writer thread."""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _ensure_started(self):
+        if self.running:
+            return
+        with self._lock:
+            # The thread does not survive a fork, so this also restarts it in workers
+            if self.running:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="analytics-writer", daemon=True
+            )
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(batch)
+                return
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+
+            self._write(batch)
+            batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.insert(batch)
+        except Exception:
+            # Silently fail - analytics should not break the app
+            self.failed += len(batch)
@@ -0,0 +1,97 @@
+"""Fingerprinted, precompressed static assets built by Vite.
+
+`npm run build` writes content-hashed bundles (`bundle.1a2b3c4d.js`), their
+`.gz`/`.br` siblings and `static/manifest.json`, which maps the logical names
+to the hashed files. Without a manifest (e.g. a checkout that has not been
+built) the fixed names are used and nothing is marked immutable.
+"""
+import json
+import os
+import stat
+from mimetypes import guess_type
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from services.compression import choose_encoding
+
+STATIC_DIR = "static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Precompressed siblings, most preferred first
+PRECOMPRESSED = {"br": ".br", "gzip": ".gz"}
+
+
+def load_manifest(directory=STATIC_DIR):
+    """Map of logical asset names to fingerprinted file names."""
+    try:
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+manifest = load_manifest()
+
+
+def asset_url(name):
+    """URL of the current build of asset `name`, e.g. "bundle.css"."""
+    return f"/static/{manifest.get(name, name)}"
+
+
+def preload_links():
+    """Link header that lets browsers start fetching the bundles before parsing the page."""
+    return ", ".join(
+        [
+            f"<{asset_url('bundle.css')}>; rel=preload; as=style",
+            f"<{asset_url('bundle.js')}>; rel=preload; as=script",
+        ]
+    )
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves a `.br` or `.gz` sibling when the client accepts
+    it, and marks fingerprinted files (the manifest's values) immutable.
+    """
+
+    def __init__(self, *, directory, manifest=None, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.fingerprinted = set((manifest or {}).values())
+
+    async def get_response(self, path, scope):
+        response = await self._precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if path in self.fingerprinted and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    async def _precompressed_response(self, path, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return None
+        request_headers = Headers(scope=scope)
+        available = {}
+        for encoding, suffix in PRECOMPRESSED.items():
+            try:
+                full_path, stat_result = await anyio.to_thread.run_sync(
+                    self.lookup_path, path + suffix
+                )
+            except (OSError, ValueError):
+                continue
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                available[encoding] = (full_path, stat_result)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""), available)
+        if encoding is None:
+            return None
+
+        full_path, stat_result = available[encoding]
+        response = FileResponse(
+            full_path,
+            stat_result=stat_result,
+            media_type=guess_type(path)[0],
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,80 @@
+"""Cache for one expensive value that is refreshed in the background."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshingCache:
+    """
+    Hold the result of `compute()` for `ttl` seconds.
+
+    Concurrent callers that find no value share a single computation. Once
+    the value is older than `ttl` it is still returned while one background
+    thread computes the next. `invalidate()` discards the value, so the next
+    `get()` waits for a fresh one. A `ttl` of 0 or less disables caching.
+    """
+
+    def __init__(self, compute, ttl, name="refreshing-cache"):
+        self.compute = compute
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._value = None
+        self._computed_at = None
+        self._computing = False
+        # Bumped by invalidate(), so a computation that started earlier
+        # does not store its result
+        self._generation = 0
+
+    def get(self):
+        """Return `(value, computed_at)`, where `computed_at` is epoch seconds."""
+        if self.ttl <= 0:
+            return self.compute(), time.time()
+        with self._lock:
+            while self._computed_at is None and self._computing:
+                self._done.wait()
+            if self._computed_at is not None:
+                if time.time() - self._computed_at >= self.ttl and not self._computing:
+                    self._computing = True
+                    threading.Thread(
+                        target=self._refresh_in_background,
+                        args=(self._generation,),
+                        name=self.name,
+                        daemon=True,
+                    ).start()
+                return self._value, self._computed_at
+            self._computing = True
+            generation = self._generation
+        return self._refresh(generation)
+
+    def invalidate(self):
+        """Drop the cached value, e.g. after the data behind it changed."""
+        with self._lock:
+            self._generation += 1
+            self._value = self._computed_at = None
+
+    def _refresh(self, generation):
+        try:
+            value = self.compute()
+            computed_at = time.time()
+        except BaseException:
+            with self._lock:
+                self._computing = False
+                self._done.notify_all()
+            raise
+        with self._lock:
+            if generation == self._generation:
+                self._value, self._computed_at = value, computed_at
+            self._computing = False
+            self._done.notify_all()
+        return value, computed_at
+
+    def _refresh_in_background(self, generation):
+        try:
+            self._refresh(generation)
+        except Exception:
+            # The stale value stays in place until a refresh succeeds
+            logger.exception("Refreshing %s failed", self.name)
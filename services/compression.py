@@ -0,0 +1,156 @@
+"""Response compression negotiated from Accept-Encoding.
+
+gzip is always available. zstd and brotli are used when a codec is
+importable: the stdlib `compression.zstd` (Python 3.14+) or `zstandard`, and
+`brotli` or `brotlicffi`.
+"""
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+from config import (
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_ZSTD_LEVEL,
+)
+from services.timing import phase
+
+
+def _gzip(body):
+    # mtime=0 keeps the output deterministic for a given body
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+try:
+    from compression import zstd
+
+    def _zstd(body):
+        return zstd.compress(body, level=COMPRESSION_ZSTD_LEVEL)
+
+except ImportError:
+    try:
+        import zstandard
+
+        def _zstd(body):
+            return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+
+    except ImportError:
+        _zstd = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+
+
+# Available codecs, most preferred first
+CODECS = {"zstd": _zstd, "br": _brotli if brotli else None, "gzip": _gzip}
+CODECS = {name: codec for name, codec in CODECS.items() if codec is not None}
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def choose_encoding(accept_encoding, codecs=CODECS):
+    """
+    Pick the codec the client accepts with the highest q-value; ties go to
+    the order of `codecs`. Returns None if nothing acceptable is available.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in codecs:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress complete text responses of at least `minimum_size` bytes.
+
+    Responses that already have a Content-Encoding, are not text, or stream
+    their body in several messages pass through unchanged.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, codecs=CODECS):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.codecs = codecs
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.codecs
+        )
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(
+                    COMPRESSIBLE_TYPES
+                ):
+                    await send(message)
+                    return
+                # The encoding depends on the request headers
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            held, start = start, None
+            body = message.get("body", b"")
+            if (
+                encoding is None
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+            ):
+                await send(held)
+                await send(message)
+                return
+
+            with phase("compression"):
+                body = self.codecs[encoding](body)
+            headers = MutableHeaders(scope=held)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            # The compressed bytes differ from the identity representation
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(held)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
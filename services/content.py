@@ -0,0 +1,68 @@
+"""Cache for pages rendered from files on disk."""
+import hashlib
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+
+class RenderedFile:
+    """
+    Hold the HTML rendered from a file until the file's mtime changes.
+
+    `render` receives the file's text and returns the final HTML string.
+    `salt` is mixed into the ETag so it also changes when other parts of the
+    page (e.g. asset URLs in the page headers) change.
+    """
+
+    def __init__(self, path, render, salt=""):
+        self.path = path
+        self.render = render
+        self.salt = salt
+        self.html = None
+        self.etag = None
+        self.last_modified = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return self, re-rendering first if the file changed on disk."""
+        mtime = os.stat(self.path).st_mtime
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load(mtime)
+        return self
+
+    def _load(self, mtime):
+        with open(self.path, "r", encoding="utf-8") as file:
+            html = self.render(file.read())
+        digest = hashlib.sha256((self.salt + html).encode()).hexdigest()[:16]
+        self.html = html
+        self.etag = f'"{digest}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self._mtime = mtime
+
+    @property
+    def headers(self):
+        """Validators and cache policy: browsers may store but must revalidate."""
+        return {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": "no-cache",
+        }
+
+    def is_fresh(self, request_headers):
+        """Whether the client's cached copy is current (so a 304 can be sent)."""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(
+                    self.last_modified
+                )
+            except (TypeError, ValueError):
+                return False
+        return False
@@ -0,0 +1,125 @@
+"""Streaming exports of the analytics database."""
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import zlib
+from config import ANALYTICS_DB
+from services.partitions import partitions
+
+CHUNK_SIZE = 64 * 1024
+
+
+def snapshot_database(path=ANALYTICS_DB):
+    """
+    Copy the database into a temp file with SQLite's online backup API.
+
+    The copy is consistent even while events are being written. The caller
+    is responsible for deleting the returned file.
+    """
+    fd, snapshot = tempfile.mkstemp(prefix="kniffel_analytics_", suffix=".db")
+    os.close(fd)
+    source = sqlite3.connect(path)
+    target = sqlite3.connect(snapshot)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return snapshot
+
+
+def remove_file(path):
+    """Delete a file if it still exists."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress an iterable of byte chunks into a gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_file(path, remove=False):
+    """Yield a file in chunks, optionally deleting it afterwards."""
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+    finally:
+        if remove:
+            remove_file(path)
+
+
+# The columns of the `events_readable` view, read from one partition table
+# at a time. CROSS JOIN keeps the partition as the outer loop, so rows come
+# straight off its rowid order with no temp B-tree sort.
+READABLE_COLUMNS = [
+    "id",
+    "session_hash",
+    "event_type",
+    "timestamp",
+    "player_count",
+    "categories_filled",
+    "category",
+    "value",
+    "metadata",
+]
+_READABLE_PARTITION = """
+    SELECT e.id, e.session_hash, t.name AS event_type,
+           datetime(e.ts, 'unixepoch', 'localtime') AS timestamp,
+           e.player_count, e.categories_filled, c.name AS category,
+           e.value, e.metadata
+    FROM {name} e
+    CROSS JOIN event_types t ON t.id = e.event_type_id
+    LEFT JOIN categories c ON c.id = e.category_id
+    ORDER BY e.id
+"""
+
+
+def iter_events(fmt, path=ANALYTICS_DB, batch_size=1000):
+    """
+    Stream the events as "csv" or "ndjson" bytes, with the columns of the
+    `events_readable` view.
+
+    Partitions are read oldest first, each in id order, inside one read
+    transaction. Rows are fetched in batches, so memory use does not depend
+    on the size of the table.
+    """
+    # A streaming response advances the generator on whichever threadpool
+    # thread is free. Only one thread uses the connection at a time.
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(READABLE_COLUMNS)
+        for name in partitions(conn):
+            cursor = conn.execute(_READABLE_PARTITION.format(name=name))
+            while rows := cursor.fetchmany(batch_size):
+                if fmt == "csv":
+                    writer.writerows(rows)
+                    chunk = buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    chunk = "".join(
+                        json.dumps(dict(zip(READABLE_COLUMNS, row)), ensure_ascii=False)
+                        + "\n"
+                        for row in rows
+                    )
+                yield chunk.encode()
+        if fmt == "csv" and buffer.tell():
+            yield buffer.getvalue().encode()
+    finally:
+        conn.close()
@@ -1,23 +1,59 @@
 """Game logic and scoring calculations."""
-from models import categories, fixed_scores, upper_section
+from collections import Counter, namedtuple
+from models import (
+    categories,
+    fixed_scores,
+    upper_section,
+    upper_bonus,
+    upper_bonus_threshold,
+)
+
+ScoreCard = namedtuple(
+    "ScoreCard", ["upper_total", "bonus", "lower_total", "total", "missing"]
+)
+
+# Positions of the upper-section categories in `categories` order, so scoring
+# a card is a single pass without list lookups
+_upper_indices = frozenset(
+    i for i, cat in enumerate(categories) if cat in upper_section
+)
+_category_names = tuple(categories)
+
+
+def score_values(values, empty=None):
+    """
+    Compute all totals and the missing categories for one player in one pass.
+    `values` holds one score per category in `categories` order; `empty`
+    marks categories that have not been filled.
+    """
+    upper_total = lower_total = 0
+    missing = []
+    for i, value in enumerate(values):
+        if value is None or value == empty:
+            missing.append(_category_names[i])
+        elif i in _upper_indices:
+            upper_total += value
+        else:
+            lower_total += value
+    bonus = upper_bonus if upper_total >= upper_bonus_threshold else 0
+    return ScoreCard(
+        upper_total, bonus, lower_total, upper_total + bonus + lower_total, missing
+    )
+
+
+def score_card(user_scores):
+    """
+    Compute the score card for a `{category: score}` dict.
+    """
+    return score_values([user_scores.get(cat) for cat in _category_names])
 
 
 def calculate_scores(user_scores):
     """
     Calculate the scores for the game and return the upper total, bonus, and total as a tuple.
     """
-    upper_total = sum(user_scores.get(cat, 0) or 0 for cat in upper_section)
-    bonus = 35 if upper_total >= 63 else 0
-    total = (
-        upper_total
-        + bonus
-        + sum(
-            user_scores.get(cat, 0) or 0
-            for cat in categories
-            if cat not in upper_section
-        )
-    )
-    return upper_total, bonus, total
+    card = score_card(user_scores)
+    return card.upper_total, card.bonus, card.total
 
 
 def is_fixed_score_category(category):
@@ -28,3 +64,31 @@ def is_fixed_score_category(category):
 def get_fixed_score_value(category):
     """Get the fixed score value for a category."""
     return fixed_scores.get(category)
+
+
+def dice_score(category, dice):
+    """
+    Points that five dice (values 1-6) score in a category. A Kniffel is not
+    a Full House, and there is no extra Kniffel bonus.
+    """
+    if category in upper_section:
+        face = upper_section.index(category) + 1
+        return face * dice.count(face)
+    counts = sorted(Counter(dice).values())
+    faces = set(dice)
+    if category == "Dreierpasch":
+        return sum(dice) if counts[-1] >= 3 else 0
+    if category == "Viererpasch":
+        return sum(dice) if counts[-1] >= 4 else 0
+    if category == "Full House":
+        return fixed_scores[category] if counts == [2, 3] else 0
+    if category == "Kleine Straße":
+        runs = ({1, 2, 3, 4}, {2, 3, 4, 5}, {3, 4, 5, 6})
+        return fixed_scores[category] if any(run <= faces for run in runs) else 0
+    if category == "Große Straße":
+        return fixed_scores[category] if faces in ({1, 2, 3, 4, 5}, {2, 3, 4, 5, 6}) else 0
+    if category == "Kniffel":
+        return fixed_scores[category] if counts == [5] else 0
+    if category == "Chance":
+        return sum(dice)
+    raise KeyError(category)
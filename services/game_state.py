@@ -0,0 +1,155 @@
+"""Server-side game state store keyed by a small id kept in the session.
+
+The session cookie only carries `game_id`; the game itself is a
+`Scoreboard` kept in a pluggable backend.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from config import (
+    GAME_STATE_BACKEND,
+    GAME_STATE_DB,
+    GAME_STATE_MAX_ENTRIES,
+    GAME_STATE_TTL_DAYS,
+)
+from services.analytics_db import connections
+from services.scheduler import PeriodicJob
+from services.scoreboard import Scoreboard
+
+
+class MemoryStore:
+    """In-process LRU store; games are lost on restart and not shared across workers."""
+
+    def __init__(self, max_entries=GAME_STATE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._games = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        with self._lock:
+            game = self._games.get(game_id)
+            if game is not None:
+                self._games.move_to_end(game_id)
+            return game
+
+    def set(self, game_id, game):
+        with self._lock:
+            self._games[game_id] = game
+            self._games.move_to_end(game_id)
+            while len(self._games) > self.max_entries:
+                self._games.popitem(last=False)
+
+    def delete(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+
+    def purge(self, max_age_days=GAME_STATE_TTL_DAYS):
+        """Nothing to do; the LRU bound already limits memory use."""
+        return 0
+
+
+class SQLiteStore:
+    """
+    Persistent store shared by all workers that use the same database file.
+    Connections come from `services.analytics_db`: WAL mode and a busy
+    timeout, so concurrent workers' writes wait for each other instead of
+    failing with "database is locked".
+    """
+
+    def __init__(self, path=GAME_STATE_DB):
+        self.path = path
+        self._db = connections(path)
+        with self._db.writer() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS game_state (
+                    game_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_game_state_updated_at ON game_state(updated_at)"
+            )
+
+    def get(self, game_id):
+        with self._db.reader() as conn:
+            row = conn.execute(
+                "SELECT state FROM game_state WHERE game_id = ?", (game_id,)
+            ).fetchone()
+        return Scoreboard.loads(row[0]) if row else None
+
+    def set(self, game_id, game):
+        with self._db.writer() as conn:
+            conn.execute(
+                """
+                INSERT INTO game_state (game_id, state, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(game_id) DO UPDATE SET
+                    state = excluded.state, updated_at = excluded.updated_at
+            """,
+                (game_id, game.dumps(), time.time()),
+            )
+
+    def delete(self, game_id):
+        with self._db.writer() as conn:
+            conn.execute("DELETE FROM game_state WHERE game_id = ?", (game_id,))
+
+    def purge(self, max_age_days=GAME_STATE_TTL_DAYS):
+        """Delete games that have not been touched for `max_age_days`."""
+        cutoff = time.time() - max_age_days * 86400
+        with self._db.writer() as conn:
+            return conn.execute(
+                "DELETE FROM game_state WHERE updated_at < ?", (cutoff,)
+            ).rowcount
+
+
+_backends = {"memory": MemoryStore, "sqlite": SQLiteStore}
+_store = None
+
+
+def get_store():
+    """Return the configured store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = _backends[GAME_STATE_BACKEND]()
+    return _store
+
+
+def load_game(session):
+    """
+    Load the game for this session, or an empty, unsaved one if it has none.
+    Nothing is stored until the first `save_game`, so page loads and other
+    reads from one-off visitors do not leave games behind.
+
+    Games stored in the cookie by older versions are moved into the store.
+    """
+    game_id = session.get("game_id")
+    game = get_store().get(game_id) if game_id else None
+    if game is None:
+        legacy = "users" in session or "scores" in session
+        game = Scoreboard.from_dict(
+            {"users": session.pop("users", []), "scores": session.pop("scores", {})}
+        )
+        if legacy:
+            save_game(session, game)
+    return game
+
+
+def save_game(session, game):
+    """Persist the game for this session, giving the session a game id if needed."""
+    if "game_id" not in session:
+        session["game_id"] = uuid.uuid4().hex
+    get_store().set(session["game_id"], game)
+
+
+_purge_job = PeriodicJob("game-state-purge", lambda: get_store().purge(), 24 * 3600)
+
+
+def start_game_state():
+    """Start the daily purge of abandoned games."""
+    _purge_job.start()
+
+
+def stop_game_state():
+    """Stop the purge job."""
+    _purge_job.stop()
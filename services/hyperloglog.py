@@ -0,0 +1,51 @@
+"""HyperLogLog sketches for approximate distinct counts.
+
+A sketch is `2**precision` one-byte registers stored as bytes, so it can be
+kept in a BLOB column. Sketches of disjoint or overlapping sets merge by
+taking the register-wise maximum, and the estimate of the union has a
+relative standard error of about `1.04 / sqrt(2**precision)`.
+"""
+import hashlib
+import math
+
+
+def empty(precision):
+    """A sketch of the empty set."""
+    return bytearray(1 << precision)
+
+
+def standard_error(precision):
+    """Relative standard error of an estimate at `precision`."""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def add(registers, value, precision):
+    """Add the string `value` to the bytearray sketch `registers` in place."""
+    x = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+    width = 64 - precision
+    index = x >> width
+    rank = width - (x & ((1 << width) - 1)).bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def merge(*sketches):
+    """Register-wise maximum of equally sized sketches."""
+    merged = bytearray(sketches[0])
+    for sketch in sketches[1:]:
+        merged = bytearray(map(max, merged, sketch))
+    return merged
+
+
+def estimate(registers):
+    """Estimated number of distinct values added to the sketch."""
+    m = len(registers)
+    if m == 0:
+        return 0
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / math.fsum(2.0**-r for r in registers)
+    zeros = registers.count(0)
+    # Linear counting is more accurate while many registers are still empty
+    if raw <= 2.5 * m and zeros:
+        return round(m * math.log(m / zeros))
+    return round(raw)
@@ -0,0 +1,205 @@
+"""Time-partitioned storage for analytics events.
+
+Events are stored in one table per period (`events_p20261018` for the day
+starting 2026-10-18 UTC), listed in the `event_partitions` catalog. Readers
+query the `events` view, a UNION ALL over every partition that is rebuilt
+whenever a partition is added or dropped. Expiring a period is a DROP TABLE
+instead of a row-by-row DELETE.
+
+Ids come from `event_sequence` so they stay unique and increasing across
+partitions, which the rollups rely on for their high-water mark.
+"""
+from datetime import datetime, timezone
+from config import ANALYTICS_PARTITION_DAYS
+
+COLUMNS = [
+    "id",
+    "session_hash",
+    "event_type_id",
+    "ts",
+    "player_count",
+    "categories_filled",
+    "category_id",
+    "value",
+    "metadata",
+]
+
+CATALOG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS event_partitions (
+        name TEXT PRIMARY KEY,
+        start_ts INTEGER NOT NULL,
+        end_ts INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_event_partitions_period
+    ON event_partitions(start_ts, end_ts, name)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS event_sequence (
+        last_id INTEGER NOT NULL
+    )
+    """,
+]
+
+_PARTITION_TABLE = """
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY,
+        session_hash TEXT NOT NULL,
+        event_type_id INTEGER NOT NULL REFERENCES event_types(id),
+        ts INTEGER NOT NULL CHECK (ts >= {start} AND ts < {end}),
+        player_count INTEGER,
+        categories_filled INTEGER,
+        category_id INTEGER REFERENCES categories(id),
+        value INTEGER,
+        metadata TEXT
+    )
+"""
+
+# The dashboard index set (schema v3), created on every partition
+_PARTITION_INDEXES = [
+    "CREATE INDEX {name}_ts_session ON {name}(ts, session_hash)",
+    "CREATE INDEX {name}_type_session_players"
+    " ON {name}(event_type_id, session_hash, player_count)",
+    "CREATE INDEX {name}_category_type ON {name}(category_id, event_type_id)",
+    "CREATE INDEX {name}_session_filled ON {name}(session_hash, categories_filled)",
+]
+
+
+def create_catalog(conn, last_id=0):
+    """Create the partition catalog and start the id sequence after `last_id`."""
+    for statement in CATALOG_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO event_sequence (last_id) VALUES (?)", (last_id,))
+
+
+def partition_bounds(ts, days=ANALYTICS_PARTITION_DAYS):
+    """Start and end (epoch seconds) of the period that contains `ts`."""
+    size = days * 86400
+    start = ts // size * size
+    return start, start + size
+
+
+def free_period(catalog, ts, days=ANALYTICS_PARTITION_DAYS):
+    """
+    Bounds for a new partition holding `ts`, given the `(start, end, name)`
+    rows of the catalog: the period from `partition_bounds`, trimmed so it
+    does not overlap an existing partition. Partitions created under another
+    ANALYTICS_PARTITION_DAYS keep their bounds, and since every bound is a
+    day boundary the trimmed period also gets a name of its own.
+    """
+    start, end = partition_bounds(ts, days)
+    for other_start, other_end, _ in catalog:
+        if other_end <= ts:
+            start = max(start, other_end)
+        elif other_start > ts:
+            end = min(end, other_start)
+    return start, end
+
+
+def create_partition(conn, start, end):
+    """Create an empty partition table for [start, end) and return its name."""
+    day = datetime.fromtimestamp(start, timezone.utc).strftime("%Y%m%d")
+    name = f"events_p{day}"
+    conn.execute(_PARTITION_TABLE.format(name=name, start=start, end=end))
+    for statement in _PARTITION_INDEXES:
+        conn.execute(statement.format(name=name))
+    conn.execute(
+        "INSERT INTO event_partitions (name, start_ts, end_ts) VALUES (?, ?, ?)",
+        (name, start, end),
+    )
+    return name
+
+
+def partitions(conn, since=None):
+    """Names of the partitions holding events at or after `since`, oldest first."""
+    if since is None:
+        rows = conn.execute("SELECT name FROM event_partitions ORDER BY start_ts")
+    else:
+        rows = conn.execute(
+            "SELECT name FROM event_partitions WHERE end_ts > ? ORDER BY start_ts",
+            (since,),
+        )
+    return [name for (name,) in rows]
+
+
+def union_sql(names, columns=COLUMNS):
+    """A SELECT of `columns` over the given partitions, valid even if there are none."""
+    if not names:
+        return "SELECT " + ", ".join(f"NULL AS {c}" for c in columns) + " WHERE 0"
+    select = ", ".join(columns)
+    return " UNION ALL ".join(f"SELECT {select} FROM {name}" for name in names)
+
+
+def events_subquery(conn, *columns, since=None):
+    """
+    Subquery over the partitions that can hold events at or after `since`.
+
+    Aggregates over the `events` view read whole rows; projecting only the
+    needed `columns` lets SQLite answer each partition from a covering index.
+    """
+    return f"({union_sql(partitions(conn, since), columns or COLUMNS)})"
+
+
+def rebuild_view(conn):
+    """Point the `events` view at the current set of partitions."""
+    conn.execute("DROP VIEW IF EXISTS events")
+    conn.execute(f"CREATE VIEW events AS {union_sql(partitions(conn))}")
+
+
+def last_event_id(conn):
+    """The highest id handed out so far."""
+    return conn.execute("SELECT last_id FROM event_sequence").fetchone()[0]
+
+
+def insert_events(conn, rows):
+    """
+    Insert coded event rows (all columns but `id`), routing each to the
+    partition for its timestamp.
+    """
+    if not rows:
+        return
+    last_id = conn.execute(
+        "UPDATE event_sequence SET last_id = last_id + ? RETURNING last_id",
+        (len(rows),),
+    ).fetchone()[0]
+    # Newest first: almost every event belongs to the current period
+    catalog = conn.execute(
+        "SELECT start_ts, end_ts, name FROM event_partitions ORDER BY start_ts DESC"
+    ).fetchall()
+    created = False
+    by_partition = {}
+    for event_id, row in enumerate(rows, last_id - len(rows) + 1):
+        ts = row[2]
+        name = next((n for start, end, n in catalog if start <= ts < end), None)
+        if name is None:
+            start, end = free_period(catalog, ts, ANALYTICS_PARTITION_DAYS)
+            name = create_partition(conn, start, end)
+            catalog.insert(0, (start, end, name))
+            created = True
+        by_partition.setdefault(name, []).append((event_id, *row))
+    if created:
+        rebuild_view(conn)
+    placeholders = ", ".join("?" * len(COLUMNS))
+    for name, partition_rows in by_partition.items():
+        conn.executemany(
+            f"INSERT INTO {name} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+            partition_rows,
+        )
+
+
+def expired_partitions(conn, cutoff):
+    """Names of the partitions whose whole period lies before `cutoff`."""
+    rows = conn.execute(
+        "SELECT name FROM event_partitions WHERE end_ts <= ? ORDER BY start_ts",
+        (cutoff,),
+    )
+    return [name for (name,) in rows]
+
+
+def drop_partition(conn, name):
+    """Drop a partition table and remove it from the view."""
+    conn.execute(f"DROP TABLE {name}")
+    conn.execute("DELETE FROM event_partitions WHERE name = ?", (name,))
+    rebuild_view(conn)
@@ -0,0 +1,382 @@
+"""Incrementally maintained rollups over the analytics events table.
+
+The dashboard reads these small tables instead of scanning every event.
+`refresh_rollups` folds in all events above a high-water mark on `id`, so it
+can run in the same transaction as the insert that produced them.
+
+Distinct sessions are also kept as one HyperLogLog sketch per hour, so the
+number of sessions in any window of whole hours can be estimated by merging
+a few sketches instead of counting `rollup_sessions`.
+"""
+from datetime import datetime
+from config import ANALYTICS_HLL_PRECISION
+from services import hyperloglog
+from services.partitions import drop_partition, last_event_id
+
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rollup_sessions (
+        session_hash TEXT PRIMARY KEY,
+        first_seen INTEGER NOT NULL,
+        last_seen INTEGER NOT NULL,
+        max_categories_filled INTEGER,
+        max_player_count INTEGER
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_sessions_last_seen
+    ON rollup_sessions(last_seen)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_sessions_first_seen
+    ON rollup_sessions(first_seen)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_sessions_players
+    ON rollup_sessions(max_player_count)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_sessions_filled
+    ON rollup_sessions(max_categories_filled)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_categories (
+        category_id INTEGER PRIMARY KEY,
+        total INTEGER NOT NULL,
+        crossed_out INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_categories_total
+    ON rollup_categories(total, crossed_out)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_hourly (
+        hour INTEGER NOT NULL,
+        event_type_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (hour, event_type_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_hourly_type
+    ON rollup_hourly(event_type_id, count)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_session_sketches (
+        hour INTEGER PRIMARY KEY,
+        registers BLOB NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+]
+
+# Sketch row holding the merge of every hour, i.e. all retained sessions
+TOTAL_SKETCH = -1
+
+_CROSSED_OUT = "(SELECT id FROM event_types WHERE name = 'score_crossed_out')"
+_PLAYER_ADDED = "(SELECT id FROM event_types WHERE name = 'player_added')"
+
+# Per-session aggregates; the scalar max(coalesce(a, b), coalesce(b, a)) keeps
+# MAX() semantics when either side is NULL
+_SESSION_AGGREGATES = f"""
+    SELECT session_hash, MIN(ts), MAX(ts), MAX(categories_filled),
+           MAX(CASE WHEN event_type_id = {_PLAYER_ADDED} THEN player_count END)
+    FROM events
+    WHERE {{where}}
+    GROUP BY session_hash
+"""
+
+_UPSERT_SESSIONS = (
+    """
+    INSERT INTO rollup_sessions
+    (session_hash, first_seen, last_seen, max_categories_filled, max_player_count)
+    """
+    + _SESSION_AGGREGATES
+    + """
+    ON CONFLICT(session_hash) DO UPDATE SET
+        first_seen = min(first_seen, excluded.first_seen),
+        last_seen = max(last_seen, excluded.last_seen),
+        max_categories_filled = max(
+            coalesce(max_categories_filled, excluded.max_categories_filled),
+            coalesce(excluded.max_categories_filled, max_categories_filled)
+        ),
+        max_player_count = max(
+            coalesce(max_player_count, excluded.max_player_count),
+            coalesce(excluded.max_player_count, max_player_count)
+        )
+    """
+)
+
+
+def init_rollups(conn):
+    """Create the rollup tables and fold in any existing events."""
+    for statement in ROLLUP_SCHEMA:
+        conn.execute(statement)
+    refresh_rollups(conn)
+    # Sketches are rebuilt if they are missing (e.g. a database from before
+    # they existed) or were made with another precision
+    row = conn.execute(
+        "SELECT length(registers) FROM rollup_session_sketches LIMIT 1"
+    ).fetchone()
+    if row is None or row[0] != 1 << ANALYTICS_HLL_PRECISION:
+        conn.execute("DELETE FROM rollup_session_sketches")
+        _add_to_sketches(conn, "id <= ?", (last_event_id(conn),))
+
+
+def refresh_rollups(conn):
+    """Fold all events above the high-water mark into the rollups."""
+    row = conn.execute(
+        "SELECT value FROM rollup_state WHERE key = 'last_event_id'"
+    ).fetchone()
+    low = row[0] if row else 0
+    high = last_event_id(conn)
+    if high <= low:
+        return
+    bounds = (low, high)
+
+    conn.execute(
+        """
+        INSERT INTO rollup_hourly (hour, event_type_id, count)
+        SELECT ts / 3600, event_type_id, COUNT(*)
+        FROM events
+        WHERE id > ? AND id <= ?
+        GROUP BY 1, 2
+        ON CONFLICT(hour, event_type_id) DO UPDATE SET count = count + excluded.count
+    """,
+        bounds,
+    )
+    conn.execute(
+        f"""
+        INSERT INTO rollup_categories (category_id, total, crossed_out)
+        SELECT category_id, COUNT(*), SUM(event_type_id = {_CROSSED_OUT})
+        FROM events
+        WHERE id > ? AND id <= ? AND category_id IS NOT NULL
+        GROUP BY category_id
+        ON CONFLICT(category_id) DO UPDATE SET
+            total = total + excluded.total,
+            crossed_out = crossed_out + excluded.crossed_out
+    """,
+        bounds,
+    )
+    conn.execute(_UPSERT_SESSIONS.format(where="id > ? AND id <= ?"), bounds)
+    _add_to_sketches(conn, "id > ? AND id <= ?", bounds)
+    conn.execute(
+        """
+        INSERT INTO rollup_state (key, value) VALUES ('last_event_id', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """,
+        (high,),
+    )
+
+
+def _load_sketch(conn, hour):
+    row = conn.execute(
+        "SELECT registers FROM rollup_session_sketches WHERE hour = ?", (hour,)
+    ).fetchone()
+    if row is None or len(row[0]) != 1 << ANALYTICS_HLL_PRECISION:
+        return hyperloglog.empty(ANALYTICS_HLL_PRECISION)
+    return bytearray(row[0])
+
+
+def _save_sketches(conn, sketches):
+    conn.executemany(
+        """
+        INSERT INTO rollup_session_sketches (hour, registers) VALUES (?, ?)
+        ON CONFLICT(hour) DO UPDATE SET registers = excluded.registers
+    """,
+        [(hour, bytes(registers)) for hour, registers in sketches.items()],
+    )
+
+
+def _add_to_sketches(conn, where, params):
+    """Add the sessions of the events matching `where` to their hours' sketches."""
+    sketches = {}
+    rows = conn.execute(
+        f"SELECT DISTINCT ts / 3600, session_hash FROM events WHERE {where}", params
+    ).fetchall()
+    for hour, session_hash in rows:
+        for key in (hour, TOTAL_SKETCH):
+            if key not in sketches:
+                sketches[key] = _load_sketch(conn, key)
+            hyperloglog.add(sketches[key], session_hash, ANALYTICS_HLL_PRECISION)
+    _save_sketches(conn, sketches)
+
+
+def sketch_sessions(conn, start=None, end=None):
+    """
+    Estimated number of distinct sessions with events in the hours that
+    overlap [start, end) (epoch seconds); all retained sessions by default.
+    """
+    if start is None and end is None:
+        return hyperloglog.estimate(_load_sketch(conn, TOTAL_SKETCH))
+    first = (start or 0) // 3600
+    last = (end - 1) // 3600 if end is not None else None
+    merged = hyperloglog.empty(ANALYTICS_HLL_PRECISION)
+    rows = conn.execute(
+        """
+        SELECT registers FROM rollup_session_sketches
+        WHERE hour >= ? AND (? IS NULL OR hour <= ?)
+    """,
+        (first, last, last),
+    )
+    for (registers,) in rows:
+        if len(registers) == len(merged):
+            merged = hyperloglog.merge(merged, registers)
+    return hyperloglog.estimate(merged)
+
+
+def expire_partition(conn, name):
+    """
+    Drop the partition table `name` and keep the rollups exact.
+
+    Counters are decremented by the partition's aggregates and every session
+    that had events in it is recomputed from the remaining partitions.
+    Returns the number of events dropped.
+    """
+    refresh_rollups(conn)
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS expired (session_hash TEXT PRIMARY KEY)"
+    )
+    conn.execute("DELETE FROM temp.expired")
+    conn.execute(
+        f"INSERT INTO temp.expired (session_hash) SELECT DISTINCT session_hash FROM {name}"
+    )
+    dropped = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    start, end = conn.execute(
+        "SELECT start_ts, end_ts FROM event_partitions WHERE name = ?", (name,)
+    ).fetchone()
+
+    conn.execute(f"""
+        UPDATE rollup_hourly SET count = count - d.n
+        FROM (
+            SELECT ts / 3600 AS hour, event_type_id, COUNT(*) AS n
+            FROM {name}
+            GROUP BY 1, 2
+        ) AS d
+        WHERE rollup_hourly.hour = d.hour AND rollup_hourly.event_type_id = d.event_type_id
+    """)
+    conn.execute("DELETE FROM rollup_hourly WHERE count <= 0")
+    conn.execute(f"""
+        UPDATE rollup_categories SET
+            total = total - d.n,
+            crossed_out = rollup_categories.crossed_out - d.n_crossed_out
+        FROM (
+            SELECT category_id, COUNT(*) AS n, SUM(event_type_id = {_CROSSED_OUT}) AS n_crossed_out
+            FROM {name}
+            WHERE category_id IS NOT NULL
+            GROUP BY category_id
+        ) AS d
+        WHERE rollup_categories.category_id = d.category_id
+    """)
+    conn.execute("DELETE FROM rollup_categories WHERE total <= 0")
+
+    drop_partition(conn, name)
+
+    affected = "session_hash IN (SELECT session_hash FROM temp.expired)"
+    conn.execute(f"DELETE FROM rollup_sessions WHERE {affected}")
+    conn.execute(_UPSERT_SESSIONS.format(where=affected))
+
+    # Partitions cover whole hours: drop their sketches and re-merge the total
+    conn.execute(
+        "DELETE FROM rollup_session_sketches WHERE hour >= ? AND hour < ?",
+        (start // 3600, end // 3600),
+    )
+    total = hyperloglog.empty(ANALYTICS_HLL_PRECISION)
+    for (registers,) in conn.execute(
+        "SELECT registers FROM rollup_session_sketches WHERE hour >= 0"
+    ):
+        total = hyperloglog.merge(total, registers)
+    _save_sketches(conn, {TOTAL_SKETCH: total})
+    return dropped
+
+
+def clear_rollups(conn):
+    """Empty the rollups, e.g. after all events have been deleted."""
+    conn.execute("DELETE FROM rollup_sessions")
+    conn.execute("DELETE FROM rollup_categories")
+    conn.execute("DELETE FROM rollup_hourly")
+    conn.execute("DELETE FROM rollup_session_sketches")
+
+
+def read_summary(conn, recent_cutoff, sketches=False):
+    """
+    Read the dashboard statistics from the rollups; `recent_cutoff` is epoch
+    seconds. With `sketches`, the two session counts are HyperLogLog
+    estimates, and the recent one covers whole hours from `recent_cutoff`.
+    """
+    total_events = conn.execute(
+        "SELECT COALESCE(SUM(count), 0) FROM rollup_hourly"
+    ).fetchone()[0]
+
+    if sketches:
+        unique_sessions = sketch_sessions(conn)
+        earliest_event = conn.execute(
+            "SELECT MIN(first_seen) FROM rollup_sessions"
+        ).fetchone()[0]
+    else:
+        unique_sessions, earliest_event = conn.execute(
+            "SELECT COUNT(*), MIN(first_seen) FROM rollup_sessions"
+        ).fetchone()
+
+    events_by_type = conn.execute("""
+        SELECT t.name, SUM(rollup_hourly.count) as count
+        FROM rollup_hourly
+        JOIN event_types t ON t.id = rollup_hourly.event_type_id
+        GROUP BY rollup_hourly.event_type_id
+        ORDER BY count DESC, t.name
+    """).fetchall()
+
+    if sketches:
+        recent_sessions = sketch_sessions(conn, recent_cutoff)
+    else:
+        recent_sessions = conn.execute(
+            "SELECT COUNT(*) FROM rollup_sessions WHERE last_seen > ?",
+            (recent_cutoff,),
+        ).fetchone()[0]
+
+    player_distribution = conn.execute("""
+        SELECT max_player_count, COUNT(*) as count
+        FROM rollup_sessions
+        WHERE max_player_count IS NOT NULL
+        GROUP BY max_player_count
+        ORDER BY max_player_count
+    """).fetchall()
+
+    category_stats = conn.execute("""
+        SELECT c.name, total, crossed_out
+        FROM rollup_categories
+        JOIN categories c ON c.id = rollup_categories.category_id
+        ORDER BY total DESC, c.name
+    """).fetchall()
+
+    avg_categories, max_categories, completed_sessions = conn.execute("""
+        SELECT
+            AVG(max_categories_filled),
+            MAX(max_categories_filled),
+            COUNT(CASE WHEN max_categories_filled >= 13 THEN 1 END)
+        FROM rollup_sessions
+    """).fetchone()
+
+    return {
+        "total_events": total_events,
+        "unique_sessions": unique_sessions,
+        "recent_sessions_24h": recent_sessions,
+        "sessions_estimated": sketches,
+        "events_by_type": [tuple(r) for r in events_by_type],
+        "player_distribution": [tuple(r) for r in player_distribution],
+        "category_stats": [tuple(r) for r in category_stats],
+        "avg_categories": round(avg_categories or 0, 1),
+        "max_categories": max_categories or 0,
+        "completed_sessions": completed_sessions or 0,
+        "earliest_event": (
+            datetime.fromtimestamp(earliest_event).isoformat()
+            if earliest_event is not None
+            else None
+        ),
+    }
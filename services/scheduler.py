@@ -0,0 +1,48 @@
+"""Periodic background jobs that run outside the request path."""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Run `func` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the job thread if it is not already running."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the job thread, waiting for a run in progress to finish."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def run_once(self):
+        """Run the job in the calling thread and remember its result."""
+        try:
+            self.last_result = self.func()
+        except Exception:
+            logger.exception("Background job %s failed", self.name)
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,124 @@
+"""Compact, array-backed scoreboard used as the game state."""
+import json
+from array import array
+from models import categories
+from services.game import score_values
+
+# Sentinel for a category that has not been filled yet
+EMPTY = -(2**31)
+
+category_index = {category: i for i, category in enumerate(categories)}
+_category_names = tuple(categories)
+_blank_card = array("i", [EMPTY] * len(categories))
+
+
+class Scoreboard:
+    """
+    Players in join order, each with a fixed-length int array holding one
+    score per category in `models.categories` order.
+    """
+
+    __slots__ = ("users", "_cards")
+
+    def __init__(self, users=(), cards=None):
+        self.users = list(users)
+        self._cards = cards if cards is not None else {}
+        for user in self.users:
+            self._cards.setdefault(user, array("i", _blank_card))
+
+    def add_user(self, user):
+        """Add a player with an empty card; names already in the game are ignored."""
+        if user in self.users:
+            return
+        self.users.append(user)
+        self._cards[user] = array("i", _blank_card)
+
+    def remove_user(self, user):
+        self.users.remove(user)
+        self._cards.pop(user, None)
+
+    def reset(self):
+        """Clear every player's scores."""
+        for user in self.users:
+            self._cards[user] = array("i", _blank_card)
+
+    def get(self, user, category):
+        """Score for a user and category, or None if it is empty."""
+        value = self._cards[user][category_index[category]]
+        return None if value == EMPTY else value
+
+    def set(self, user, category, value):
+        """Set a score; None empties the category."""
+        self._cards[user][category_index[category]] = EMPTY if value is None else value
+
+    def score_card(self, user):
+        """Totals and missing categories for one player."""
+        return score_values(self._cards[user], EMPTY)
+
+    def filled_count(self):
+        """Count filled categories across all players."""
+        return sum(
+            len(card) - card.count(EMPTY)
+            for user, card in self._cards.items()
+            if user in self.users
+        )
+
+    def to_dict(self):
+        """Convert to the `{"users": [...], "scores": {user: {category: score}}}` format."""
+        return {
+            "users": list(self.users),
+            "scores": {
+                user: {
+                    _category_names[i]: value
+                    for i, value in enumerate(self._cards[user])
+                    if value != EMPTY
+                }
+                for user in self.users
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, game):
+        """Build a scoreboard from the dict format used by older sessions."""
+        users = game.get("users", [])
+        scores = game.get("scores", {})
+        board = cls(users)
+        for user in users:
+            for category, value in scores.get(user, {}).items():
+                if category in category_index:
+                    board.set(user, category, value)
+        return board
+
+    def dumps(self):
+        """Serialize to compact JSON: one list per player, null for empty."""
+        return json.dumps(
+            {
+                "users": self.users,
+                "cards": [
+                    [None if v == EMPTY else v for v in self._cards[user]]
+                    for user in self.users
+                ],
+            },
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def loads(cls, text):
+        """Deserialize from `dumps` output or from the old dict format."""
+        data = json.loads(text)
+        if "scores" in data:
+            return cls.from_dict(data)
+        return cls(
+            data["users"],
+            {
+                user: array("i", [EMPTY if v is None else v for v in card])
+                for user, card in zip(data["users"], data["cards"])
+            },
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Scoreboard) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Scoreboard({self.to_dict()!r})"
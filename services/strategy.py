@@ -0,0 +1,133 @@
+"""Best-move advisor backed by a precomputed strategy table.
+
+`python -m services.strategy_solver` (needs NumPy) writes the expected number
+of points still to come under optimal play for every state of a player's
+card. A state is the set of filled categories plus the upper-section total
+capped at 63, so the table holds 2**13 * 64 float32 values (2 MiB). The
+server memory-maps the file read-only, so all workers share one copy in the
+page cache, and ranks the open categories for a roll by the points they
+score now plus the value of the state they lead to.
+"""
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+from config import STRATEGY_TABLE
+from models import categories, upper_section, upper_bonus, upper_bonus_threshold
+from services.game import dice_score
+
+MAGIC = b"KNFS"
+VERSION = 1
+# magic, format version, number of categories, number of states
+HEADER = struct.Struct("<4sHHI")
+VALUE = struct.Struct("<f")
+UPPER_STATES = upper_bonus_threshold + 1
+STATES = (1 << len(categories)) * UPPER_STATES
+
+_category_bits = {category: 1 << i for i, category in enumerate(categories)}
+_upper = frozenset(upper_section)
+
+
+def state_index(filled, upper_total):
+    """Table index for a bit mask of filled categories and an upper total."""
+    return filled * UPPER_STATES + min(upper_total, upper_bonus_threshold)
+
+
+def card_state(user_scores):
+    """The filled-categories bit mask and upper total of a `{category: score}` dict."""
+    filled = upper_total = 0
+    for category, value in user_scores.items():
+        if value is not None and category in _category_bits:
+            filled |= _category_bits[category]
+            if category in _upper:
+                upper_total += value
+    return filled, upper_total
+
+
+@lru_cache(maxsize=None)
+def _roll_points(dice):
+    # There are only 252 distinct sorted rolls
+    return {category: dice_score(category, dice) for category in categories}
+
+
+def parse_dice(text):
+    """Five dice from e.g. "66612" or "6 6 6 1 2", sorted; ValueError otherwise."""
+    dice = tuple(sorted(int(c) for c in text if not c.isspace() and c != ","))
+    if len(dice) != 5 or not all(1 <= die <= 6 for die in dice):
+        raise ValueError(f"not five dice: {text!r}")
+    return dice
+
+
+class StrategyTable:
+    """Read-only, memory-mapped strategy table file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        expected = (MAGIC, VERSION, len(categories), STATES)
+        if (
+            len(self._mmap) != HEADER.size + VALUE.size * STATES
+            or HEADER.unpack_from(self._mmap) != expected
+        ):
+            self._mmap.close()
+            raise ValueError(f"{path} is not a strategy table for these rules")
+
+    def expected(self, filled, upper_total):
+        """Expected points still to come from a state under optimal play."""
+        offset = HEADER.size + VALUE.size * state_index(filled, upper_total)
+        return VALUE.unpack_from(self._mmap, offset)[0]
+
+    def rank(self, user_scores, dice):
+        """
+        The open categories for a final roll, best first, as
+        `(category, points, value)` tuples. `value` adds any upper bonus the
+        move earns and the expected points of the rest of the game.
+        """
+        filled, upper_total = card_state(user_scores)
+        upper_total = min(upper_total, upper_bonus_threshold)
+        roll_points = _roll_points(tuple(sorted(dice)))
+        moves = []
+        for category, bit in _category_bits.items():
+            if filled & bit:
+                continue
+            points = roll_points[category]
+            after, bonus = upper_total, 0
+            if category in _upper:
+                after = upper_total + points
+                if upper_total < upper_bonus_threshold <= after:
+                    bonus = upper_bonus
+            value = points + bonus + self.expected(filled | bit, after)
+            moves.append((category, points, value))
+        moves.sort(key=lambda move: move[2], reverse=True)
+        return moves
+
+    def best_category(self, user_scores, dice):
+        """The category to fill with `dice`, or None if the card is full."""
+        moves = self.rank(user_scores, dice)
+        return moves[0][0] if moves else None
+
+    def close(self):
+        self._mmap.close()
+
+
+# Mapped tables by path. A path without a file maps to _MISSING, so the
+# filesystem is checked once per process rather than on every render; a
+# table built later is picked up after a restart
+_tables = {}
+_tables_lock = threading.Lock()
+_MISSING = object()
+
+
+def get_table(path=None):
+    """The strategy table at `path`, mapped on first use; None if it has not been built."""
+    path = path or STRATEGY_TABLE
+    table = _tables.get(path)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(path)
+            if table is None:
+                table = _tables[path] = (
+                    StrategyTable(path) if os.path.exists(path) else _MISSING
+                )
+    return None if table is _MISSING else table
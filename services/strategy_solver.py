@@ -0,0 +1,115 @@
+"""Offline solver that builds the best-move advisor's strategy table.
+
+    python -m services.strategy_solver [strategy.bin]
+
+Needs NumPy, which the server itself does not. The solver works backwards
+from the full card: for every set of filled categories and upper total it
+computes the expected points of the rest of the game when every turn (three
+rolls, keeping any dice in between) and every category choice maximizes that
+expectation. A full solve takes well under a minute.
+"""
+import os
+import sys
+import time
+from collections import Counter
+from itertools import combinations, combinations_with_replacement, product
+import numpy as np
+from config import STRATEGY_TABLE
+from models import categories, upper_section, upper_bonus, upper_bonus_threshold
+from services.game import dice_score
+from services.strategy import HEADER, MAGIC, STATES, UPPER_STATES, VERSION
+
+FACES = range(1, 7)
+# Every final roll and every set of dice that can be kept, as sorted tuples
+ROLLS = list(combinations_with_replacement(FACES, 5))
+KEEPS = [keep for n in range(6) for keep in combinations_with_replacement(FACES, n)]
+
+
+def _roll_probabilities(n):
+    """Probability of each sorted outcome of rolling `n` dice."""
+    outcomes = Counter(tuple(sorted(dice)) for dice in product(FACES, repeat=n))
+    return {dice: count / 6**n for dice, count in outcomes.items()}
+
+
+def transitions():
+    """
+    `(moves, choices)`: `moves[k, r]` is the probability that keeping
+    `KEEPS[k]` and rolling the rest ends in `ROLLS[r]`; `choices[r]` lists
+    the keeps available from `ROLLS[r]`, padded by repetition to equal length.
+    """
+    roll_index = {dice: r for r, dice in enumerate(ROLLS)}
+    keep_index = {keep: k for k, keep in enumerate(KEEPS)}
+    probabilities = [_roll_probabilities(n) for n in range(6)]
+    moves = np.zeros((len(KEEPS), len(ROLLS)))
+    for k, keep in enumerate(KEEPS):
+        for dice, p in probabilities[5 - len(keep)].items():
+            moves[k, roll_index[tuple(sorted(keep + dice))]] += p
+
+    choices = []
+    for dice in ROLLS:
+        keeps = sorted({keep for n in range(6) for keep in combinations(dice, n)})
+        choices.append([keep_index[keep] for keep in keeps])
+    width = max(len(keeps) for keeps in choices)
+    choices = np.array([keeps + keeps[:1] * (width - len(keeps)) for keeps in choices])
+    return moves, choices
+
+
+def solve(min_filled=0):
+    """
+    Expected remaining points per state, shaped `(2**13, 64)` and indexed by
+    filled-categories bit mask and capped upper total. States with fewer than
+    `min_filled` filled categories are left at 0.
+    """
+    moves, choices = transitions()
+    first_roll = moves[KEEPS.index(())]
+    points = np.array([[dice_score(c, dice) for c in categories] for dice in ROLLS])
+    upper = np.arange(UPPER_STATES)[:, None]
+    upper_indices = {i for i, category in enumerate(categories) if category in upper_section}
+
+    full = (1 << len(categories)) - 1
+    table = np.zeros((full + 1, UPPER_STATES))
+    # Filling a category sets a bit, so every successor has a larger mask
+    for filled in range(full - 1, -1, -1):
+        if bin(filled).count("1") < min_filled:
+            continue
+        # Value of each final roll: the best open category for it
+        final = np.full((UPPER_STATES, len(ROLLS)), -np.inf)
+        for i in range(len(categories)):
+            bit = 1 << i
+            if filled & bit:
+                continue
+            scored = points[:, i]
+            if i in upper_indices:
+                total = upper + scored
+                reached = (upper < upper_bonus_threshold) & (total >= upper_bonus_threshold)
+                bonus = upper_bonus * reached
+                after = np.minimum(total, upper_bonus_threshold)
+                value = scored + bonus + table[filled | bit][after]
+            else:
+                value = scored + table[filled | bit][:, None]
+            np.maximum(final, value, out=final)
+        # Two rerolls: keep the dice with the best expected outcome
+        for _ in range(2):
+            final = (final @ moves.T)[:, choices].max(axis=2)
+        table[filled] = final @ first_roll
+    return table
+
+
+def write_table(table, path=STRATEGY_TABLE):
+    """Write the table atomically, so running servers keep their mapped copy."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(categories), STATES))
+        file.write(table.astype("<f4").tobytes())
+    os.replace(temporary, path)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else STRATEGY_TABLE
+    start = time.perf_counter()
+    table = solve()
+    write_table(table, path)
+    print(
+        f"{path}: expected score {table[0, 0]:.2f} "
+        f"(solved in {time.perf_counter() - start:.0f} s)"
+    )
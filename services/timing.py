@@ -0,0 +1,242 @@
+"""Per-request phase timing, latency histograms and a slow-request log.
+
+`RequestTimingMiddleware` wraps the whole app and `SessionBoundaryMiddleware`
+sits just inside the session middleware. Together with the before/after hooks
+around the route handler they split every request into phases:
+
+    session_load  cookie decoded and verified
+    handler       route function, excluding analytics
+    analytics     time spent in log_event
+    render        FT components rendered to HTML
+    compression   response body compressed
+    session_save  session re-encoded and signed, excluding compression
+
+Each response gets a `Server-Timing` header, and per-route statistics are
+kept in memory (per process) for the admin timing page.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from starlette.datastructures import MutableHeaders
+from config import TIMING_SLOW_MS, TIMING_SLOW_BUFFER
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, float("inf"))
+PHASES = (
+    "session_load",
+    "handler",
+    "analytics",
+    "render",
+    "compression",
+    "session_save",
+)
+
+_current = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Timestamps and accumulated phase durations for one request."""
+
+    __slots__ = ("marks", "durations")
+
+    def __init__(self):
+        self.marks = {"start": time.perf_counter()}
+        self.durations = {}
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def _between(self, first, last):
+        if first in self.marks and last in self.marks:
+            return self.marks[last] - self.marks[first]
+        return None
+
+    def phases(self):
+        """Phase durations in ms; phases that did not happen are left out."""
+        analytics = self.durations.get("analytics", 0.0)
+        handler = self._between("handler_start", "handler_end")
+        # The compression middleware holds the response back between the
+        # session boundary and the outer middleware while it compresses
+        compression = self.durations.get("compression")
+        saved = self._between("response_ready", "sent")
+        spans = {
+            "session_load": self._between("start", "session_loaded"),
+            "handler": handler - analytics if handler is not None else None,
+            "analytics": analytics if handler is not None else None,
+            "render": self._between("handler_end", "response_ready"),
+            "compression": compression,
+            "session_save": (
+                saved - (compression or 0.0) if saved is not None else None
+            ),
+            "total": self._between("start", "sent"),
+        }
+        return {k: v * 1000 for k, v in spans.items() if v is not None}
+
+
+@contextmanager
+def phase(name):
+    """Time a block of code as part of the current request, if there is one."""
+    timing = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing is not None:
+            timing.add(name, time.perf_counter() - started)
+
+
+def _mark(name):
+    timing = _current.get()
+    if timing is not None:
+        timing.mark(name)
+
+
+def mark_handler_start(req):
+    """Beforeware: the route handler is about to run."""
+    _mark("handler_start")
+
+
+def mark_handler_end(req, resp):
+    """After-hook: the route handler has returned."""
+    _mark("handler_end")
+
+
+class RouteStats:
+    """Latency histogram and phase totals for one route."""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets", "phase_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.phase_ms = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phases):
+        total = phases.get("total", 0.0)
+        self.count += 1
+        self.total_ms += total
+        self.max_ms = max(self.max_ms, total)
+        for i, bound in enumerate(BUCKETS_MS):
+            if total <= bound:
+                self.buckets[i] += 1
+                break
+        for name in PHASES:
+            self.phase_ms[name] += phases.get(name, 0.0)
+
+    def quantile(self, q):
+        """Upper bucket bound below which a fraction `q` of requests fall."""
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= target:
+                return bound if bound != float("inf") else self.max_ms
+        return self.max_ms
+
+
+class TimingStats:
+    """Per-route statistics plus a ring buffer of recent slow requests."""
+
+    def __init__(self, slow_ms=TIMING_SLOW_MS, slow_buffer=TIMING_SLOW_BUFFER):
+        self.slow_ms = slow_ms
+        self.routes = {}
+        self.slow_requests = deque(maxlen=slow_buffer)
+        self._lock = threading.Lock()
+
+    def record(self, route, path, status, phases):
+        with self._lock:
+            self.routes.setdefault(route, RouteStats()).add(phases)
+            if phases.get("total", 0.0) >= self.slow_ms:
+                self.slow_requests.append(
+                    {
+                        "time": datetime.now(),
+                        "route": route,
+                        "path": path,
+                        "status": status,
+                        "phases": phases,
+                    }
+                )
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+            self.slow_requests.clear()
+
+
+stats = TimingStats()
+
+
+def _route_key(scope):
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    return f"{scope['method']} {path}"
+
+
+def server_timing_header(phases):
+    return ", ".join(
+        f"{name.replace('_', '-')};dur={ms:.2f}" for name, ms in phases.items()
+    )
+
+
+class RequestTimingMiddleware:
+    """Outermost middleware: starts the clock and reports the phases."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timing.mark("sent")
+                phases = timing.phases()
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", server_timing_header(phases)
+                )
+                stats.record(
+                    _route_key(scope), scope["path"], message["status"], phases
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+
+
+class SessionBoundaryMiddleware:
+    """Sits just inside the session middleware to mark where loading ends and saving starts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        timing = _current.get()
+        if scope["type"] != "http" or timing is None:
+            await self.app(scope, receive, send)
+            return
+
+        timing.mark("session_loaded")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timing.mark("response_ready")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
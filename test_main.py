@@ -1,13 +1,59 @@
+import anyio
+import gzip
+import json
+import os
 import pytest
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
 import uuid
+from datetime import datetime, timedelta
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
 from starlette.testclient import TestClient
 from app import app
-from services.game import calculate_scores
+from fasthtml.common import to_xml
+from components import prerender
+from components.game import ScoreTableContainer, player_key
+from routes import game as game_routes
+from routes.lazy import LAZY_MODULES, LazyRoutes
+from config import ADMIN_PASSWORD, ANALYTICS_HLL_PRECISION
+from services import analytics, export, game_state, hyperloglog, strategy
+from services.analytics import flush_events, log_event
+from services.analytics_db import connections
+from services.analytics_schema import SCHEMA_VERSION, _v1_legacy_events
+from services.partitions import partitions
+from services.rollups import read_summary, sketch_sessions
+from services.analytics_writer import AnalyticsWriter
+from services.cache import RefreshingCache
+from services.assets import IMMUTABLE, PrecompressedStaticFiles, load_manifest
+from services.compression import CompressionMiddleware, choose_encoding
+from services.content import RenderedFile
+from services.game_state import MemoryStore, SQLiteStore, load_game, save_game
+from services.scoreboard import Scoreboard
+from services.timing import RequestTiming, stats as timing_stats
+from services.game import calculate_scores, score_card
 from models import categories, fixed_scores, upper_section
 
 client = TestClient(app)
 
 
+@pytest.fixture
+def analytics_db(tmp_path, monkeypatch):
+    """Point the analytics service at a fresh database"""
+    flush_events()
+    db = str(tmp_path / "analytics.db")
+    monkeypatch.setattr(analytics, "ANALYTICS_DB", db)
+    analytics.init_analytics_db()
+    yield db
+    flush_events()
+
+
 def test_calculate_scores_empty():
     """Test calculate_scores with empty scores"""
     user_scores = {}
@@ -60,6 +106,19 @@ def test_calculate_scores_with_lower_section():
     assert total == 182  # 72 + 35 + 25 + 50
 
 
+def test_score_card_single_pass():
+    """score_card returns all totals and the missing categories at once"""
+    user_scores = {"Einser": 3, "Sechser": 30, "Vierer": 16, "Fünfer": 15, "Kniffel": 50, "Chance": None}
+    card = score_card(user_scores)
+    assert card.upper_total == 64
+    assert card.bonus == 35
+    assert card.lower_total == 50
+    assert card.total == 149
+    assert card.missing == ["Zweier", "Dreier", "Dreierpasch", "Viererpasch",
+                            "Full House", "Kleine Straße", "Große Straße", "Chance"]
+    assert calculate_scores(user_scores) == (64, 35, 149)
+
+
 def test_categories_structure():
     """Test that categories are properly defined"""
     assert len(categories) == 13
@@ -111,6 +170,22 @@ def test_add_duplicate_user():
     assert content.count(delete_pattern) == 1
 
 
+def test_add_user_strips_names_before_the_duplicate_check():
+    """Names differing only in surrounding spaces are one player, blank names none"""
+    game_client = TestClient(app)
+    game_client.post("/add-user", data={"username": "Bob"})
+    game_client.post("/add-user", data={"username": "Bob "})
+    response = game_client.post("/add-user", data={"username": "   "})
+    assert response.content.decode().count("/delete-user/") == 1
+    response = game_client.post("/delete-user/Bob")
+    assert response.status_code == 200
+    assert b"Bob</th>" not in response.content
+
+    game = Scoreboard(["Anna"])
+    game.add_user("Anna")
+    assert game.users == ["Anna"]
+
+
 def test_update_score():
     """Test updating a score"""
     client.post("/add-user", data={"username": "Charlie"})
@@ -190,3 +265,1000 @@ def test_full_game_flow():
     assert "Gesamtsumme" in content_reset
     # Count occurrences of "0" in the Gesamtsumme row - should be at least 1 for user2
     assert ">0</td>" in content_reset
+
+
+def test_log_event_is_written_after_flush(analytics_db):
+    """Queued events land in the database once flushed"""
+    session = {}
+    game = Scoreboard.from_dict({"users": ["Alice"], "scores": {"Alice": {"Einser": 3}}})
+    log_event(session, game, "player_added")
+    log_event(session, game, "score_entered", category="Einser", value=3)
+    flush_events()
+
+    conn = sqlite3.connect(analytics_db)
+    rows = conn.execute(
+        "SELECT event_type, player_count, categories_filled, category"
+        " FROM events_readable ORDER BY id"
+    ).fetchall()
+    conn.close()
+    assert rows == [
+        ("player_added", 1, 1, None),
+        ("score_entered", 1, 1, "Einser"),
+    ]
+
+
+def test_rolled_back_dictionary_ids_are_not_cached(analytics_db, monkeypatch):
+    """A dictionary id from a failed write is not reused for its name"""
+    now = int(datetime.now().timestamp())
+
+    def fail(conn, rows):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    with monkeypatch.context() as m:
+        m.setattr(analytics, "insert_events", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            analytics._write_events([("s1", "lost_type", now, 1, 0, None, None, None)])
+    # The rolled-back id goes to the next new name
+    analytics._write_events([("s1", "other_type", now, 1, 0, None, None, None)])
+    analytics._write_events([("s1", "lost_type", now, 1, 0, None, None, None)])
+
+    conn = sqlite3.connect(analytics_db)
+    rows = conn.execute("SELECT event_type FROM events_readable ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [("other_type",), ("lost_type",)]
+
+
+def test_analytics_writer_batches_and_counts_drops():
+    """The writer batches rows and counts events dropped by a full queue"""
+    written, batches = [], []
+    gate = threading.Event()
+
+    def insert(rows):
+        gate.wait(5)
+        batches.append(len(rows))
+        written.extend(rows)
+
+    writer = AnalyticsWriter(insert, queue_size=1, batch_size=1, flush_interval=60)
+    for i in range(3):
+        writer.enqueue(i)
+    assert writer.dropped >= 1
+
+    gate.set()
+    writer.flush()
+    assert len(written) + writer.dropped == 3
+    assert all(size == 1 for size in batches)
+    writer.stop()
+    assert not writer.running
+
+
+def test_cleanup_old_events_drops_expired_partitions(analytics_db):
+    """Retention drops only expired partitions and reports what it did"""
+    old = int((datetime.now() - timedelta(days=40)).timestamp())
+    new = int(datetime.now().timestamp())
+    analytics._write_events(
+        [("a", "player_added", old, 1, 0, None, None, None)] * 5
+        + [("b", "player_added", new, 1, 0, None, None, None)] * 2
+    )
+
+    conn = sqlite3.connect(analytics_db)
+    assert len(partitions(conn)) == 2
+    conn.close()
+
+    report = analytics.cleanup_old_events()
+    assert report["rows_removed"] == 5
+    assert report["partitions_dropped"] == 1
+    assert report["duration_ms"] >= 0
+
+    conn = sqlite3.connect(analytics_db)
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
+    assert len(partitions(conn)) == 1
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+
+
+def test_partition_days_can_change_on_a_live_database(analytics_db, monkeypatch):
+    """New partitions fit around existing ones when the period length changes"""
+    from services import partitions as partitions_module
+
+    week = 7 * 86400
+    start = int(datetime.now().timestamp()) // week * week - week
+    day = 86400
+    monkeypatch.setattr(partitions_module, "ANALYTICS_PARTITION_DAYS", 1)
+    analytics._write_events(
+        [("a", "player_added", start + d * day + 60, 1, 0, None, None, None) for d in (0, 2)]
+    )
+    monkeypatch.setattr(partitions_module, "ANALYTICS_PARTITION_DAYS", 7)
+    analytics._write_events(
+        [
+            ("b", "player_added", ts, 1, 0, None, None, None)
+            for ts in (start + day + 60, start + 3 * day, start + week)
+        ]
+    )
+
+    conn = sqlite3.connect(analytics_db)
+    catalog = conn.execute(
+        "SELECT start_ts, end_ts FROM event_partitions ORDER BY start_ts"
+    ).fetchall()
+    assert catalog == [
+        (start, start + day),
+        (start + day, start + 2 * day),
+        (start + 2 * day, start + 3 * day),
+        (start + 3 * day, start + week),
+        (start + week, start + 2 * week),
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 5
+    conn.close()
+
+
+def _synthetic_events(now):
+    """Events spread over several sessions, some outside the retention window"""
+    rows = []
+    for s in range(12):
+        session = f"s{s:02d}"
+        ts = int((now - timedelta(days=s * 3, hours=s)).timestamp())
+        players = s % 4 + 1
+        for p in range(players):
+            rows.append((session, "player_added", ts, p + 1, 0, None, None, None))
+        for i, category in enumerate(list(categories)[: s + 2]):
+            event = "score_crossed_out" if i % 3 == 0 else "score_entered"
+            rows.append((session, event, ts, players, i + 1, category, i, None))
+        rows.append((session, "scores_reset", ts, players, None, None, None, None))
+    return rows
+
+
+def test_rollup_summary_matches_exact_queries(analytics_db):
+    """The rollup-backed summary returns the same numbers as the full scans"""
+    rows = _synthetic_events(datetime.now())
+    analytics._write_events(rows[: len(rows) // 2])
+    analytics._write_events(rows[len(rows) // 2 :])
+
+    summary = analytics.get_analytics_summary()
+    assert "error" not in summary
+    assert summary == analytics.get_exact_analytics_summary()
+    assert summary["total_events"] == len(rows)
+
+    # Retention must keep the rollups exact
+    analytics.cleanup_old_events()
+    summary = analytics.get_analytics_summary()
+    assert summary == analytics.get_exact_analytics_summary()
+    assert summary["unique_sessions"] == 10
+
+    analytics.reset_analytics()
+    assert analytics.get_analytics_summary() == analytics.get_exact_analytics_summary()
+
+
+def test_session_sketches_stay_within_error_bound(analytics_db, monkeypatch):
+    """HyperLogLog session counts stay within 3 standard errors of the exact counts"""
+    now = datetime.now()
+    rows = []
+    for s in range(6000):
+        # Sessions over the last three days, a third of them seen in two hours,
+        # and some older than the retention window
+        days = 40 if s % 10 == 0 else 0
+        for hours in {s % 72, (s * 7) % 72 if s % 3 == 0 else s % 72}:
+            ts = int((now - timedelta(days=days, hours=hours)).timestamp())
+            rows.append((f"session-{s}", "player_added", ts, 1, 0, None, None, None))
+    for i in range(0, len(rows), 1000):
+        analytics._write_events(rows[i : i + 1000])
+    monkeypatch.setattr(analytics, "ANALYTICS_SESSION_COUNTING", "sketch")
+    bound = 3 * hyperloglog.standard_error(ANALYTICS_HLL_PRECISION)
+
+    def check():
+        estimated = analytics.get_analytics_summary()
+        exact = analytics.get_exact_analytics_summary()
+        assert estimated["sessions_estimated"] and not exact["sessions_estimated"]
+        error = abs(estimated["unique_sessions"] - exact["unique_sessions"])
+        assert error <= bound * exact["unique_sessions"]
+        # Any window of whole hours
+        hour = int(now.timestamp()) // 3600 * 3600
+        with connections(analytics_db).reader() as conn:
+            windows = [(hour - 23 * 3600, hour + 3600), (hour - 48 * 3600, hour - 24 * 3600)]
+            for start, end in windows:
+                count = conn.execute(
+                    "SELECT COUNT(DISTINCT session_hash) FROM events WHERE ts >= ? AND ts < ?",
+                    (start, end),
+                ).fetchone()[0]
+                assert abs(sketch_sessions(conn, start, end) - count) <= bound * count
+        return exact["unique_sessions"]
+
+    assert check() == 6000
+    # Expired partitions take their hours out of the sketches
+    assert analytics.cleanup_old_events()["partitions_dropped"]
+    assert check() == 5400
+    analytics.reset_analytics()
+    assert analytics.get_analytics_summary()["unique_sessions"] == 0
+
+
+def test_summary_queries_use_indexes(analytics_db):
+    """Every dashboard query is answered from an index, never a full table scan"""
+    analytics._write_events(_synthetic_events(datetime.now()))
+    statements = []
+    with connections(analytics_db).reader() as conn:
+        conn.set_trace_callback(statements.append)
+        read_summary(conn, 0)
+        read_summary(conn, 0, sketches=True)
+        analytics._exact_summary(conn)
+        conn.set_trace_callback(None)
+
+        tables = {
+            name
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        queries = [sql for sql in statements if sql.lstrip().startswith("SELECT")]
+        assert len(queries) >= 15
+        for sql in queries:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            assert any("INDEX" in step or "PRIMARY KEY" in step for step in plan), sql
+            full_scans = [
+                step for step in plan
+                if step.startswith("SCAN ") and step.split()[1] in tables and "USING" not in step
+            ]
+            assert not full_scans, (sql, plan)
+
+
+def test_legacy_analytics_db_is_migrated(tmp_path, monkeypatch):
+    """A v1 database with text columns is converted to the integer-coded schema"""
+    db = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db)
+    _v1_legacy_events(conn)
+    conn.executemany(
+        "INSERT INTO events (session_hash, event_type, timestamp, player_count,"
+        " categories_filled, category, value, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("s1", "player_added", "2026-01-02T10:00:00.123456", 1, 0, None, None, None),
+            ("s1", "score_entered", "2026-01-02T10:05:00", 1, 1, "Einser", 3,
+             '{"category": "Einser", "value": 3}'),
+            ("s1", "score_crossed_out", "2026-01-02T10:06:00", 1, 2, "Chance", 0,
+             '{"category": "Chance", "value": 0, "source": "test"}'),
+        ],
+    )
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    flush_events()
+    monkeypatch.setattr(analytics, "ANALYTICS_DB", db)
+    analytics.init_analytics_db()
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    rows = conn.execute("SELECT ts, metadata FROM events ORDER BY id").fetchall()
+    assert len(partitions(conn)) == 1
+    conn.close()
+    assert rows[0] == (int(datetime(2026, 1, 2, 10).timestamp()), None)
+    assert rows[1][1] is None
+    assert json.loads(rows[2][1]) == {"source": "test"}
+
+    summary = analytics.get_analytics_summary()
+    assert summary == analytics.get_exact_analytics_summary()
+    assert summary["category_stats"] == [("Chance", 1, 1), ("Einser", 1, 0)]
+    assert summary["earliest_event"] == "2026-01-02T10:00:00"
+
+
+def test_memory_store_evicts_least_recently_used():
+    """The in-process store keeps only the most recently used games"""
+    store = MemoryStore(max_entries=2)
+    store.set("a", {"users": ["A"], "scores": {}})
+    store.set("b", {"users": ["B"], "scores": {}})
+    store.get("a")
+    store.set("c", {"users": ["C"], "scores": {}})
+    assert store.get("b") is None
+    assert store.get("a")["users"] == ["A"]
+    assert store.get("c")["users"] == ["C"]
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    """Games survive a round trip through the SQLite store"""
+    store = SQLiteStore(str(tmp_path / "game_state.db"))
+    game = Scoreboard.from_dict({"users": ["Alice"], "scores": {"Alice": {"Kleine Straße": 30}}})
+    store.set("g1", game)
+    assert store.get("g1") == game
+    store.delete("g1")
+    assert store.get("g1") is None
+
+
+def test_sqlite_store_handles_concurrent_worker_processes(tmp_path):
+    """Forked workers writing games at once wait for each other instead of failing"""
+    path = str(tmp_path / "game_state.db")
+    store = SQLiteStore(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+    pids = []
+    for worker in range(4):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for i in range(100):
+                    game = Scoreboard([f"w{worker}"])
+                    game.set(f"w{worker}", "Einser", i % 6)
+                    store.set(f"w{worker}-g{i % 10}", game)
+                    store.get(f"w{worker}-g{i % 10}")
+                code = 0
+            finally:
+                os._exit(code)
+        pids.append(pid)
+    codes = [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) for pid in pids]
+    assert codes == [0, 0, 0, 0]
+    assert store.get("w3-g9").get("w3", "Einser") == 3
+
+
+def test_load_game_moves_cookie_state_to_store():
+    """Games from old cookies move to the store; the session keeps only an id"""
+    session = {"users": ["Alice"], "scores": {"Alice": {"Einser": 3}}}
+    game = load_game(session)
+    assert game.to_dict() == {"users": ["Alice"], "scores": {"Alice": {"Einser": 3}}}
+    assert set(session) == {"game_id"}
+    assert load_game(session) == game
+
+
+def test_games_are_stored_on_first_change(monkeypatch):
+    """Loading a game for a new session stores nothing until it is saved"""
+    store = MemoryStore()
+    monkeypatch.setattr(game_state, "_store", store)
+    session = {}
+    game = load_game(session)
+    assert game.users == [] and session == {} and not store._games
+    game_client = TestClient(app)
+    assert game_client.get("/score-table").status_code == 200
+    assert not store._games
+
+    game.add_user("Anna")
+    save_game(session, game)
+    assert store.get(session["game_id"]) == game
+    assert load_game(session) == game
+
+
+def test_update_score_returns_only_changed_cells():
+    """A score edit returns the edited cell plus out-of-band totals, not the table"""
+    game_client = TestClient(app)
+    for name in ["Anna", "Ben", "Clara"]:
+        game_client.post("/add-user", data={"username": name})
+
+    response = game_client.post("/update-score/Ben/Einser", data={"value": "4"})
+    content = response.content.decode()
+    assert response.status_code == 200
+    ben = player_key("Ben")
+    assert f'id="score-{ben}-0"' in content
+    assert f'id="missing-{ben}"' in content
+    assert content.count('hx-swap-oob="true"') == 4
+    assert f'id="total-{ben}-2" class="border border-gray-200 p-2 font-bold text-sm">4<' in content
+    assert "score-table-container" not in content
+    assert "Anna" not in content and "Clara" not in content
+
+
+def test_score_cell_ids_survive_player_changes_in_another_tab():
+    """Out-of-band cell ids follow the player, not their column"""
+    game_client = TestClient(app)
+    for name in ["Anna", "Ben"]:
+        game_client.post("/add-user", data={"username": name})
+    stale_table = game_client.get("/score-table").content.decode()
+
+    # Another tab removes Anna, so Ben moves to the first column
+    game_client.post("/delete-user/Anna")
+    content = game_client.post("/update-score/Ben/Einser", data={"value": "4"}).text
+    ben = player_key("Ben")
+    for cell_id in [f"score-{ben}-0", f"missing-{ben}", f"total-{ben}-2"]:
+        assert f'id="{cell_id}"' in content
+        assert f'id="{cell_id}"' in stale_table
+    assert f'id="missing-{player_key("Anna")}"' not in content
+
+
+def test_update_score_for_unknown_user_rerenders_table():
+    """Edits for a player no longer in the game re-render the whole container"""
+    game_client = TestClient(app)
+    game_client.post("/add-user", data={"username": "Anna"})
+    response = game_client.post("/update-score/Ghost/Einser", data={"value": "4"})
+    assert response.headers["hx-retarget"] == "#score-table-container"
+    assert b"score-table-container" in response.content
+
+
+def test_update_score_rejects_values_outside_the_score_range():
+    """Values that do not fit a score cell re-render the table and change nothing"""
+    game_client = TestClient(app)
+    game_client.post("/add-user", data={"username": "Anna"})
+    game_client.post("/update-score/Anna/Einser", data={"value": "3"})
+    for value in ["3000000000", "-2147483648", "1e400", "nan", "abc"]:
+        response = game_client.post("/update-score/Anna/Einser", data={"value": value})
+        assert response.status_code == 200
+        assert response.headers["hx-retarget"] == "#score-table-container"
+        response = game_client.post(
+            "/update-scores",
+            data={"user": ["Anna", "Anna"], "category": ["Zweier", "Einser"], "value": ["4", value]},
+        )
+        assert response.headers["hx-retarget"] == "#score-table-container"
+    table = game_client.get("/score-table").content.decode()
+    assert f'id="total-{player_key("Anna")}-2" class="border border-gray-200 p-2 font-bold text-sm">3<' in table
+
+
+def test_update_scores_applies_a_batch_atomically(monkeypatch):
+    """Several edits are applied, logged and rendered together, or not at all"""
+    game_client = TestClient(app)
+    for name in ["Anna", "Ben"]:
+        game_client.post("/add-user", data={"username": name})
+    batches = []
+    monkeypatch.setattr(
+        game_routes, "log_events", lambda session, game, events: batches.append(events)
+    )
+
+    response = game_client.post(
+        "/update-scores",
+        data={
+            "user": ["Anna", "Ben", "Ben", "Anna"],
+            "category": ["Einser", "Kniffel", "Dreier", "Einser"],
+            "value": ["3", "0", "9", "4"],
+        },
+    )
+    content = response.content.decode()
+    assert response.status_code == 200
+    assert batches == [
+        [
+            ("score_entered", "Einser", 3),
+            ("score_crossed_out", "Kniffel", 0),
+            ("score_entered", "Dreier", 9),
+            ("score_entered", "Einser", 4),
+        ]
+    ]
+    # Three distinct cells, plus missing categories and three totals per user
+    assert content.count('hx-swap-oob="true"') == 3 + 2 * 4
+    anna, ben = player_key("Anna"), player_key("Ben")
+    assert content.count(f'id="score-{anna}-0"') == 1
+    assert f'id="total-{anna}-2" class="border border-gray-200 p-2 font-bold text-sm">4<' in content
+    assert f'id="total-{ben}-2" class="border border-gray-200 p-2 font-bold text-sm">9<' in content
+    assert "score-table-container" not in content
+
+    # One bad edit rejects the whole batch
+    response = game_client.post(
+        "/update-scores",
+        data={"user": ["Anna", "Ghost"], "category": ["Zweier", "Einser"], "value": ["6", "2"]},
+    )
+    assert response.headers["hx-retarget"] == "#score-table-container"
+    response = game_client.post(
+        "/update-scores",
+        data={"user": ["Anna", "Ben"], "category": ["Zweier", "Vierer"], "value": ["6", "x"]},
+    )
+    assert response.headers["hx-retarget"] == "#score-table-container"
+    assert len(batches) == 1
+    table = game_client.get("/score-table").content.decode()
+    assert f'id="total-{anna}-2" class="border border-gray-200 p-2 font-bold text-sm">4<' in table
+
+
+def test_best_move_ranks_open_categories(tmp_path, monkeypatch):
+    """The advisor adds the points now, any upper bonus and the table's future value"""
+    path = tmp_path / "strategy.bin"
+    # A table of zeros leaves only the points scored now and the bonus
+    header = strategy.HEADER.pack(
+        strategy.MAGIC, strategy.VERSION, len(categories), strategy.STATES
+    )
+    path.write_bytes(header + bytes(strategy.VALUE.size * strategy.STATES))
+    monkeypatch.setattr(strategy, "STRATEGY_TABLE", str(path))
+    table = strategy.get_table()
+
+    assert table.best_category({}, strategy.parse_dice("6 6 6 6 6")) == "Kniffel"
+    card = {"Einser": 3, "Zweier": 6, "Dreier": 9, "Vierer": 16, "Fünfer": 20}
+    assert table.rank(card, (1, 2, 3, 6, 6))[0] == ("Sechser", 12, 12 + 35)
+    with pytest.raises(ValueError):
+        strategy.parse_dice("6667")
+
+    client.post("/add-user", data={"username": "Tipp"})
+    assert 'hx-post="/best-move"' in client.get("/score-table").text
+    response = client.post("/best-move", data={"user": "Tipp", "dice": "12345"})
+    assert "Große Straße (40 Punkte)" in response.text
+    response = client.post("/best-move", data={"user": "Tipp", "dice": "1234"})
+    assert "fünf Würfel" in response.text
+
+
+def test_missing_strategy_table_is_looked_up_once(tmp_path, monkeypatch):
+    """Without a strategy table, renders do not keep checking the filesystem"""
+    lookups = []
+    exists = os.path.exists
+    monkeypatch.setattr(strategy.os.path, "exists", lambda p: lookups.append(p) or exists(p))
+    path = str(tmp_path / "missing.bin")
+    assert strategy.get_table(path) is None
+    assert strategy.get_table(path) is None
+    assert lookups == [path]
+
+
+def test_strategy_solver_last_turn_values(tmp_path):
+    """With one category open the solver finds the known optimal turn values"""
+    pytest.importorskip("numpy")
+    from services.strategy_solver import solve, write_table
+
+    table = solve(min_filled=12)
+    full = (1 << len(categories)) - 1
+    only = {category: full & ~(1 << i) for i, category in enumerate(categories)}
+    assert table[only["Chance"], 0] == pytest.approx(23.333, abs=1e-3)
+    assert table[only["Kniffel"], 0] == pytest.approx(2.3014, abs=1e-3)
+    assert table[only["Sechser"], 0] == pytest.approx(12.639, abs=1e-3)
+
+    path = str(tmp_path / "strategy.bin")
+    write_table(table, path)
+    assert strategy.StrategyTable(path).expected(only["Chance"], 0) == pytest.approx(23.333, abs=1e-3)
+
+
+def test_render_cache_keeps_score_table_markup():
+    """Prerendered labels and options produce the same table as building them each time"""
+    board = Scoreboard.from_dict(
+        {"users": ["Anna", "Ben"], "scores": {"Anna": {"Einser": 3, "Kniffel": 50}}}
+    )
+
+    def markup():
+        html = to_xml(ScoreTableContainer(board)) + to_xml(ScoreTableContainer(Scoreboard()))
+        return re.sub(r">\s+<", "><", html).strip()
+
+    with prerender.disabled():
+        expected = markup()
+    assert markup() == expected
+    assert 'value="50" selected' in expected
+    assert categories["Kniffel"] in expected
+
+
+def test_choose_encoding_follows_q_values():
+    """The preferred codec is the one with the highest q-value the server supports"""
+    codecs = {"br": None, "gzip": None}
+    assert choose_encoding("gzip, deflate, br", codecs) == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5", codecs) == "gzip"
+    assert choose_encoding("*;q=0.1, br;q=0", codecs) == "gzip"
+    assert choose_encoding("identity", codecs) is None
+
+
+def test_text_responses_are_compressed():
+    """Large fragments are gzipped; small, identity-only and streamed responses are not"""
+    game_client = TestClient(app)
+    game_client.post("/add-user", data={"username": "Anna"})
+    response = game_client.get(
+        "/score-table", headers={"Accept-Encoding": "gzip", "HX-Request": "true"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert "Anna" in response.text
+
+    plain = game_client.get(
+        "/score-table", headers={"Accept-Encoding": "identity", "HX-Request": "true"}
+    )
+    assert "content-encoding" not in plain.headers
+    assert plain.text == response.text
+
+    def endpoint(request):
+        size = int(request.query_params["size"])
+        if "stream" in request.query_params:
+            return StreamingResponse(iter([b"a" * size] * 2), media_type="text/csv")
+        return PlainTextResponse("a" * size)
+
+    small_app = CompressionMiddleware(
+        Starlette(routes=[Route("/", endpoint)]), minimum_size=100
+    )
+    cases = [("size=99", False), ("size=100", True), ("size=500&stream=1", False)]
+    with TestClient(small_app) as small_client:
+        for query, compressed in cases:
+            response = small_client.get(f"/?{query}", headers={"Accept-Encoding": "gzip"})
+            assert ("content-encoding" in response.headers) == compressed, query
+
+    home = game_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert home.headers["etag"].startswith("W/")
+    revisit = game_client.get("/", headers={"If-None-Match": home.headers["etag"]})
+    assert revisit.status_code == 304
+
+
+def test_static_assets_are_precompressed_and_immutable(tmp_path):
+    """Fingerprinted bundles are served from their .br/.gz siblings with long-lived caching"""
+    source = b"console.log('kniffel');" * 50
+    (tmp_path / "bundle.1a2b3c.js").write_bytes(source)
+    (tmp_path / "bundle.1a2b3c.js.gz").write_bytes(gzip.compress(source))
+    (tmp_path / "bundle.1a2b3c.js.br").write_bytes(b"brotli bytes")
+    (tmp_path / "manifest.json").write_text(json.dumps({"bundle.js": "bundle.1a2b3c.js"}))
+    static_app = PrecompressedStaticFiles(
+        directory=tmp_path, manifest=load_manifest(tmp_path)
+    )
+
+    static_client = TestClient(static_app)
+    br = static_client.get("/bundle.1a2b3c.js", headers={"Accept-Encoding": "gzip, br"})
+    assert br.headers["content-encoding"] == "br"
+    assert br.headers["content-type"].startswith("text/javascript")
+    assert br.headers["cache-control"] == IMMUTABLE
+    assert br.content == b"brotli bytes"
+
+    gz = static_client.get("/bundle.1a2b3c.js", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.content == source
+    revisit = static_client.get(
+        "/bundle.1a2b3c.js",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gz.headers["etag"]},
+    )
+    assert revisit.status_code == 304
+
+    plain = static_client.get("/bundle.1a2b3c.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["cache-control"] == IMMUTABLE
+    assert plain.content == source
+
+    unhashed = static_client.get("/manifest.json")
+    assert "cache-control" not in unhashed.headers
+
+    assert "rel=preload; as=script" in client.get("/").headers["link"]
+
+
+def test_background_jobs_run_in_one_worker(monkeypatch):
+    """Workers started with background_jobs off skip the periodic jobs"""
+    started = []
+    monkeypatch.setattr(analytics._retention_job, "start", lambda: started.append("retention"))
+    monkeypatch.setattr(game_state._purge_job, "start", lambda: started.append("purge"))
+
+    monkeypatch.setattr(app.state, "background_jobs", False)
+    with TestClient(app):
+        pass
+    assert started == []
+
+    monkeypatch.setattr(app.state, "background_jobs", True)
+    with TestClient(app):
+        pass
+    assert started == ["retention", "purge"]
+
+
+def test_worker_restarts_back_off_and_give_up():
+    """Workers that keep dying at startup are restarted ever slower, then not at all"""
+    import main
+
+    delays = [main.restart_delay(n) for n in range(main.MAX_EARLY_EXITS + 1)]
+    assert delays[0] == 0
+    assert all(0 < a < b for a, b in zip(delays[1:], delays[2:-1]))
+    assert delays[-1] is None
+
+
+def test_forwarded_headers_are_trusted_from_localhost_by_default(monkeypatch):
+    """Proxy headers are only trusted from 127.0.0.1 unless configured otherwise"""
+    check = [sys.executable, "-c", "import config; print(config.WEB_FORWARDED_ALLOW_IPS)"]
+    monkeypatch.delenv("WEB_FORWARDED_ALLOW_IPS", raising=False)
+    assert subprocess.run(check, capture_output=True, text=True).stdout.strip() == "127.0.0.1"
+    monkeypatch.setenv("WEB_FORWARDED_ALLOW_IPS", "10.0.0.1,10.0.0.2")
+    result = subprocess.run(check, capture_output=True, text=True)
+    assert result.stdout.strip() == "10.0.0.1,10.0.0.2"
+
+
+def test_worker_exit_status_reports_crashes(capfd):
+    """A forked worker exits 0 only after a normal return and prints crash tracebacks"""
+    import main
+
+    def crash():
+        raise RuntimeError("worker crashed")
+
+    codes = []
+    for run in (lambda: None, crash, lambda: sys.exit(3)):
+        pid = os.fork()
+        if pid == 0:
+            main._exit_with(run)
+        codes.append(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]))
+    assert codes == [0, 1, 3]
+    assert "RuntimeError: worker crashed" in capfd.readouterr().err
+
+
+def test_startup_defers_rarely_used_modules():
+    """Importing main leaves admin routes, markdown and schema setup for first use"""
+    check = (
+        "import sys, main; from starlette.testclient import TestClient; "
+        "print(sorted(set(sys.argv[1:]) & set(sys.modules))); "
+        "TestClient(main.app).get('/admin/login'); print('routes.admin' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check, *LAZY_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split("\n")[:2] == ["[]", "True"]
+
+
+def test_lazy_routes_import_their_module_on_first_request(tmp_path, monkeypatch):
+    """The stand-in imports its module on the first matching request, then steps aside"""
+    app_ = Starlette()
+    monkeypatch.setitem(sys.modules, "lazy_demo_app", app_)
+    (tmp_path / "lazy_demo.py").write_text(
+        "from starlette.responses import PlainTextResponse\n"
+        "from lazy_demo_app import router\n"
+        "router.add_route('/demo/hello', lambda request: PlainTextResponse('hello'))\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_demo", raising=False)
+    lazy = LazyRoutes(app_.router, "/demo", "lazy_demo")
+    app_.router.routes.append(lazy)
+
+    demo_client = TestClient(app_)
+    assert demo_client.get("/other").status_code == 404
+    assert "lazy_demo" not in sys.modules
+    assert demo_client.get("/demo/hello").text == "hello"
+    assert "lazy_demo" in sys.modules
+    assert lazy not in app_.router.routes
+    assert demo_client.get("/demo/missing").status_code == 404
+
+
+def test_homepage_conditional_get():
+    """Repeat visitors with a matching ETag get a 304 without a body"""
+    response = client.get("/")
+    assert response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    cached = client.get("/", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_rendered_file_invalidates_on_mtime_change(tmp_path):
+    """Cached HTML is rendered once and refreshed when the file changes"""
+    path = tmp_path / "content.md"
+    path.write_text("# Hallo", encoding="utf-8")
+    renders = []
+    page = RenderedFile(str(path), lambda text: renders.append(text) or f"<p>{text}</p>")
+
+    first_etag = page.get().etag
+    assert page.get().html == "<p># Hallo</p>"
+    assert len(renders) == 1
+
+    path.write_text("# Tschüss", encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert page.get().html == "<p># Tschüss</p>"
+    assert page.etag != first_etag
+    assert len(renders) == 2
+
+
+def test_scoreboard_round_trips_dict_format():
+    """The compact scoreboard converts losslessly to and from the dict format"""
+    game = {
+        "users": ["Alice", "Bob"],
+        "scores": {"Alice": {"Einser": 3, "Kniffel": 0}, "Bob": {"Große Straße": 40}},
+    }
+    board = Scoreboard.from_dict(game)
+    assert board.to_dict() == game
+    assert board.get("Alice", "Kniffel") == 0
+    assert board.get("Bob", "Einser") is None
+    assert board.filled_count() == 3
+    assert Scoreboard.loads(board.dumps()) == board
+    # Rows written in the old dict format still load
+    assert Scoreboard.loads(json.dumps(game)) == board
+
+    full_game = {"users": ["Alice", "Bob"], "scores": {
+        user: {category: 10 for category in categories} for user in ["Alice", "Bob"]
+    }}
+    full_board = Scoreboard.from_dict(full_game)
+    assert len(full_board.dumps()) < len(json.dumps(full_game, ensure_ascii=False)) / 3
+
+
+def test_export_streams_snapshot_and_rows(analytics_db):
+    """Exports come from a consistent snapshot or a row-by-row cursor"""
+    now = int(datetime.now().timestamp())
+    analytics._write_events(
+        [(f"s{i}", "score_entered", now, 2, i, "Einser", i, None) for i in range(2500)]
+    )
+
+    snapshot = export.snapshot_database(analytics_db)
+    conn = sqlite3.connect(snapshot)
+    assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2500
+    conn.close()
+    assert b"".join(export.iter_file(snapshot, remove=True)).startswith(b"SQLite format 3")
+    assert not os.path.exists(snapshot)
+
+    csv_lines = b"".join(export.iter_events("csv", analytics_db)).decode().splitlines()
+    assert csv_lines[0].startswith("id,session_hash,event_type")
+    assert len(csv_lines) == 2501
+
+    ndjson_chunks = list(export.iter_events("ndjson", analytics_db))
+    assert len(ndjson_chunks) == 3
+    rows = [json.loads(line) for line in b"".join(ndjson_chunks).decode().splitlines()]
+    assert rows[-1]["session_hash"] == "s2499"
+
+    compressed = b"".join(export.gzip_chunks(export.iter_events("csv", analytics_db)))
+    assert gzip.decompress(compressed).decode().splitlines() == csv_lines
+
+
+def test_event_export_reads_partitions_in_rowid_order(analytics_db):
+    """Row exports match events_readable and read each partition without sorting"""
+    now = int(datetime.now().timestamp())
+    analytics._write_events(
+        [
+            (f"s{i}", "score_entered", now - (i % 3) * 86400, 2, i, "Einser", i, None)
+            for i in range(30)
+        ]
+    )
+    conn = sqlite3.connect(analytics_db)
+    names = partitions(conn)
+    assert len(names) == 3
+    for name in names:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN " + export._READABLE_PARTITION.format(name=name)
+        ).fetchall()
+        assert not any("TEMP B-TREE" in row[-1] for row in plan), plan
+    readable = conn.execute(
+        "SELECT e.* FROM events_readable e JOIN events USING (id)"
+        " JOIN event_partitions p ON events.ts >= p.start_ts AND events.ts < p.end_ts"
+        " ORDER BY p.start_ts, e.id"
+    ).fetchall()
+    conn.close()
+    ndjson = b"".join(export.iter_events("ndjson", analytics_db)).decode()
+    rows = [json.loads(line) for line in ndjson.splitlines()]
+    assert [tuple(row.values()) for row in rows] == readable
+
+
+def test_concurrent_exports_move_between_threads(analytics_db):
+    """Streamed exports work when each chunk is read on a different threadpool thread"""
+    now = int(datetime.now().timestamp())
+    analytics._write_events(
+        [(f"s{i}", "score_entered", now, 2, i, "Einser", i, None) for i in range(500)]
+    )
+    results = []
+
+    async def consume(fmt):
+        chunks = iterate_in_threadpool(export.iter_events(fmt, analytics_db, batch_size=10))
+        results.append(b"".join([chunk async for chunk in chunks]).decode().splitlines())
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            for i in range(8):
+                tg.start_soon(consume, ("csv", "ndjson")[i % 2])
+
+    anyio.run(main)
+    assert sorted(len(lines) for lines in results) == [500] * 4 + [501] * 4
+
+
+def test_admin_download_requires_login_and_streams(analytics_db, monkeypatch):
+    """The download route is admin-only and serves gzip exports"""
+    admin_client = TestClient(app)
+    response = admin_client.get("/admin/download", follow_redirects=False)
+    assert response.status_code in (302, 303)
+
+    monkeypatch.setattr("routes.admin.ANALYTICS_DB", analytics_db)
+    admin_client.post("/admin/login", data={"password": ADMIN_PASSWORD})
+    response = admin_client.get("/admin/download?format=csv&gzip=1")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(response.content).startswith(b"id,session_hash")
+
+
+def test_event_beacon_batches_are_validated_and_limited(analytics_db, monkeypatch):
+    """Beacon batches store their valid events in one write and are size and rate limited"""
+    beacon_client = TestClient(app)
+    batch = [
+        ["ui_add_player", 1500],
+        ["ui_more_info", 0, "Chance"],
+        ["ui_add_player", 10**9],  # clamped to the maximum age
+        ["not_allowed", 0],
+        ["ui_more_info", "soon"],
+        "garbage",
+    ]
+    writes = []
+    monkeypatch.setattr(analytics, "_write_events", lambda rows: writes.append(rows))
+    store = MemoryStore()
+    monkeypatch.setattr(game_state, "_store", store)
+    assert beacon_client.post("/events/batch", json=batch).status_code == 204
+    assert len(writes) == 1
+    assert not store._games  # a beacon reads the game but never creates one
+    now = time.time()
+    assert [row[1] for row in writes[0]] == ["ui_add_player", "ui_more_info", "ui_add_player"]
+    assert writes[0][1][5] == "Chance"
+    # Stored timestamps are whole seconds
+    assert now - 3602 <= writes[0][2][2] <= now - 3599
+    # Valid JSON with the wrong types or non-finite ages is skipped, not a 500
+    for body in [
+        b'[["ui_more_info", 1, []]]',
+        b'[[[], 1]]',
+        b'[["ui_add_player", NaN]]',
+    ]:
+        assert beacon_client.post("/events/batch", content=body).status_code == 204
+    assert len(writes) == 1
+    # Huge integer ages are clamped like any other
+    body = b'[["ui_add_player", ' + b"9" * 400 + b"]]"
+    assert beacon_client.post("/events/batch", content=body).status_code == 204
+    assert now - 3602 <= writes[1][0][2] <= now - 3599
+
+    assert beacon_client.post("/events/batch", content=b"{").status_code == 400
+    assert beacon_client.post("/events/batch", json={"a": 1}).status_code == 400
+    too_many = [["ui_add_player", 0]] * 51
+    assert beacon_client.post("/events/batch", json=too_many).status_code == 413
+    too_large = [["ui_add_player", 0, "x" * 9000]]
+    assert beacon_client.post("/events/batch", json=too_large).status_code == 413
+
+    monkeypatch.setattr(analytics, "ANALYTICS_BEACON_RATE", 2)
+    monkeypatch.setattr(analytics, "_beacon_minute", None)
+    statuses = [beacon_client.post("/events/batch", json=[]).status_code for _ in range(3)]
+    assert statuses == [204, 204, 429]
+
+
+def test_refreshing_cache_single_flight_and_stale_while_revalidate():
+    """Concurrent misses compute once; an expired value is served while one refresh runs"""
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(None)
+        release.wait(5)
+        return len(calls)
+
+    cache = RefreshingCache(compute, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get()[0])) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 5 and len(calls) == 1
+
+    release.clear()
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get()[0] == 1 and cache.get()[0] == 1
+    assert len(calls) == 2
+    cache.ttl = 60
+    release.set()
+    deadline = time.time() + 5
+    while cache.get()[0] != 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get()[0] == 2
+
+    cache.invalidate()
+    assert cache.get()[0] == 3
+
+
+def test_dashboard_summary_is_cached_until_reset(analytics_db):
+    """The dashboard shows the cached summary and its time; a reset invalidates it"""
+    analytics._summary_cache.invalidate()
+    analytics._write_events(_synthetic_events(datetime.now()))
+    summary, computed_at = analytics.get_cached_analytics_summary()
+    assert summary["total_events"] > 0
+
+    analytics._write_events(_synthetic_events(datetime.now()))
+    assert analytics.get_cached_analytics_summary() == (summary, computed_at)
+    admin_client = TestClient(app)
+    admin_client.post("/admin/login", data={"password": ADMIN_PASSWORD})
+    stamp = datetime.fromtimestamp(computed_at).strftime("%d.%m.%Y %H:%M:%S")
+    assert f"Computed at {stamp}" in admin_client.get("/admin/dashboard").text
+
+    analytics.reset_analytics()
+    assert analytics.get_cached_analytics_summary()[0]["total_events"] == 0
+
+
+def test_analytics_reads_do_not_block_writes(analytics_db):
+    """WAL mode lets events be written while a dashboard read is in progress"""
+    db = connections(analytics_db)
+    with db.reader() as reader:
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert reader.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 0
+        analytics._write_events(
+            [("s1", "player_added", int(datetime.now().timestamp()), 1, 0, None, None, None)]
+        )
+        # The open read transaction keeps its snapshot
+        assert reader.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 0
+    with db.reader() as reader:
+        assert reader.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 1
+
+
+def test_server_timing_header_and_admin_timing_page():
+    """Responses report their phases and the admin page lists route latency"""
+    timing_client = TestClient(app)
+    timing_client.post("/add-user", data={"username": "Anna"})
+    response = timing_client.post("/update-score/Anna/Einser", data={"value": "3"})
+    server_timing = response.headers["server-timing"]
+    for name in ["session-load", "handler", "analytics", "render", "session-save", "total"]:
+        assert f"{name};dur=" in server_timing
+
+    assert timing_stats.routes["POST /update-score/{user}/{category}"].count >= 1
+
+    timing_client.post("/admin/login", data={"password": ADMIN_PASSWORD})
+    page = timing_client.get("/admin/timing")
+    assert page.status_code == 200
+    assert "POST /update-score/{user}/{category}" in page.content.decode()
+
+
+def test_compression_is_not_counted_as_session_save():
+    """Compressed responses report compression as its own phase"""
+    response = TestClient(app).get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "compression;dur=" in response.headers["server-timing"]
+
+    timing = RequestTiming()
+    timing.marks.update(response_ready=1.0, sent=1.5)
+    timing.add("compression", 0.4)
+    phases = timing.phases()
+    assert phases["compression"] == pytest.approx(400)
+    assert phases["session_save"] == pytest.approx(100)
@@ -1,9 +1,54 @@
 import { defineConfig } from 'vite'
 import tailwindcss from '@tailwindcss/vite'
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib'
+import { existsSync, readFileSync, rmSync, writeFileSync } from 'node:fs'
+import { join } from 'node:path'
+
+// After each build: write .gz/.br siblings of every fingerprinted file and
+// static/manifest.json, which maps e.g. "bundle.js" to "bundle.1a2b3c4d.js"
+// for the app to read at startup. Files from the previous manifest are removed.
+function precompressedManifest() {
+  let outDir
+  return {
+    name: 'precompressed-manifest',
+    apply: 'build',
+    configResolved(config) {
+      outDir = config.build.outDir
+    },
+    writeBundle(options, bundle) {
+      const manifestPath = join(outDir, 'manifest.json')
+      const previous = existsSync(manifestPath)
+        ? Object.values(JSON.parse(readFileSync(manifestPath, 'utf8')))
+        : []
+
+      const manifest = {}
+      for (const fileName of Object.keys(bundle)) {
+        manifest[fileName.replace(/\.[\w-]+(\.\w+)$/, '$1')] = fileName
+        const source = readFileSync(join(outDir, fileName))
+        writeFileSync(join(outDir, `${fileName}.gz`), gzipSync(source, { level: 9 }))
+        writeFileSync(
+          join(outDir, `${fileName}.br`),
+          brotliCompressSync(source, {
+            params: { [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY },
+          })
+        )
+      }
+
+      const current = Object.values(manifest)
+      for (const fileName of previous.filter((name) => !current.includes(name))) {
+        for (const suffix of ['', '.gz', '.br']) {
+          rmSync(join(outDir, fileName + suffix), { force: true })
+        }
+      }
+      writeFileSync(manifestPath, JSON.stringify(manifest, null, 2) + '\n')
+    },
+  }
+}
 
 export default defineConfig({
   plugins: [
     tailwindcss(),
+    precompressedManifest(),
   ],
   build: {
     lib: {
@@ -16,13 +61,9 @@ export default defineConfig({
     emptyOutDir: false,
     rollupOptions: {
       output: {
-        entryFileNames: 'bundle.js',
-        assetFileNames: (assetInfo) => {
-          if (assetInfo.name === 'style.css') {
-            return 'styles.css'
-          }
-          return assetInfo.name
-        }
+        // Content hashes in the names let the app serve them as immutable
+        entryFileNames: 'bundle.[hash].js',
+        assetFileNames: 'bundle.[hash][extname]'
       }
     }
   }